@@ -0,0 +1,101 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../src/AMM.sol";
+
+
+contract QToken is ERC20 {
+	constructor(string memory name, string memory symbol,uint256 supply) ERC20(name,symbol) {
+		_mint(msg.sender, supply );
+	}
+}
+
+/*
+	Replays the trade sequence in test/fixtures/amm_quotes.json (written by
+	amm_sim.py in the repository root) against AMM.tradeTokens and checks
+	every output, revert and pool balance against the off-chain engine
+*/
+contract AMMQuoteTest is Test {
+	AMM public amm;
+	ERC20 public tokenA;
+	ERC20 public tokenB;
+	uint256 lp_sk = uint256(keccak256(abi.encodePacked("LP")));
+	address lp = vm.addr(lp_sk);
+	uint256 trader_sk = uint256(keccak256(abi.encodePacked("TRADER")));
+	address trader = vm.addr(trader_sk);
+
+	// amm_sim status codes
+	uint256 constant OK = 0;
+	uint256 constant BAD_TRADE = 1;
+	uint256 constant UNDERFLOW = 2;
+	uint256 constant OVERFLOW = 3;
+	uint256 constant ZERO_TRADE = 4;
+	uint256 constant NO_LIQUIDITY = 5;
+	uint256 constant DIVISION_BY_ZERO = 6;
+
+	string fixture;
+
+	function setUp() public {
+		fixture = vm.readFile(string.concat(vm.projectRoot(), "/test/fixtures/amm_quotes.json"));
+		uint256 amtA = vm.parseJsonUint(fixture, ".balanceA");
+		uint256 amtB = vm.parseJsonUint(fixture, ".balanceB");
+
+		vm.startPrank(lp);
+		tokenA = new QToken( 'Allosaurus', 'ALRS', 2**64 );
+		tokenB = new QToken( 'Baryonyx', 'BYNX', 2**64 );
+		tokenA.transfer(trader, 2**63);
+		tokenB.transfer(trader, 2**63);
+
+		amm = new AMM( address(tokenA), address(tokenB) );
+		tokenA.approve( address(amm), amtA );
+		tokenB.approve( address(amm), amtB );
+		amm.provideLiquidity( amtA, amtB );
+		vm.stopPrank();
+	}
+
+	function expectTradeRevert(uint256 status) internal {
+		if( status == BAD_TRADE ) {
+			vm.expectRevert(bytes("Bad trade"));
+		} else if( status == ZERO_TRADE ) {
+			vm.expectRevert(bytes("Cannot trade 0"));
+		} else if( status == NO_LIQUIDITY ) {
+			vm.expectRevert(bytes("Invariant must be nonzero"));
+		} else if( status == UNDERFLOW || status == OVERFLOW ) {
+			vm.expectRevert(stdError.arithmeticError);
+		} else if( status == DIVISION_BY_ZERO ) {
+			vm.expectRevert(stdError.divisionError);
+		} else {
+			revert("unknown status in fixture");
+		}
+	}
+
+	function testTradesMatchSimulation() public {
+		uint256[] memory sides = vm.parseJsonUintArray(fixture, ".sides");
+		uint256[] memory sells = vm.parseJsonUintArray(fixture, ".sellAmounts");
+		uint256[] memory buys = vm.parseJsonUintArray(fixture, ".buyAmounts");
+		uint256[] memory statuses = vm.parseJsonUintArray(fixture, ".statuses");
+		uint256[] memory balancesA = vm.parseJsonUintArray(fixture, ".balancesA");
+		uint256[] memory balancesB = vm.parseJsonUintArray(fixture, ".balancesB");
+		assertGt( sides.length, 0 );
+
+		for( uint256 i = 0; i < sides.length; i++ ) {
+			ERC20 sellToken = sides[i] == 0 ? tokenA : tokenB;
+			ERC20 buyToken = sides[i] == 0 ? tokenB : tokenA;
+			uint256 prevBuyBal = buyToken.balanceOf(trader);
+
+			vm.startPrank(trader);
+			sellToken.approve(address(amm), sells[i]);
+			if( statuses[i] != OK ) {
+				expectTradeRevert(statuses[i]);
+			}
+			amm.tradeTokens( address(sellToken), sells[i] );
+			vm.stopPrank();
+
+			assertEq( buyToken.balanceOf(trader) - prevBuyBal, buys[i] );
+			assertEq( tokenA.balanceOf(address(amm)), balancesA[i] );
+			assertEq( tokenB.balanceOf(address(amm)), balancesB[i] );
+			assertEq( amm.invariant(), balancesA[i] * balancesB[i] );
+		}
+	}
+}
@@ -0,0 +1,174 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../../Source.sol";
+import "../../Destination.sol";
+
+
+contract BToken is ERC20 {
+	constructor(string memory name, string memory symbol,uint256 supply) ERC20(name,symbol) {
+		_mint(msg.sender, supply );
+	}
+}
+
+contract BridgeBatchTest is Test {
+	Source public source;
+	Destination public destination;
+	ERC20 public tokenA;
+	ERC20 public tokenB;
+	address wrappedA;
+	address wrappedB;
+	uint256 admin_sk = uint256(keccak256(abi.encodePacked("ADMIN")));
+	address admin = vm.addr(admin_sk);
+	uint256 user_sk = uint256(keccak256(abi.encodePacked("USER")));
+	address user = vm.addr(user_sk);
+
+	event Wrap( address indexed underlying_token, address indexed wrapped_token, address indexed to, uint256 amount );
+	event Withdrawal( address indexed token, address indexed recipient, uint256 amount );
+
+	function setUp() public {
+		uint256 supply = 2**100;
+
+		vm.startPrank(admin);
+		tokenA = new BToken( 'Allosaurus', 'ALRS', supply );
+		tokenB = new BToken( 'Baryonyx', 'BYNX', supply );
+		tokenA.transfer(user, supply/2);
+		tokenB.transfer(user, supply/2);
+
+		source = new Source(admin);
+		source.registerToken(address(tokenA));
+		source.registerToken(address(tokenB));
+
+		destination = new Destination(admin);
+		wrappedA = destination.createToken(address(tokenA), 'Wrapped Allosaurus', 'wALRS');
+		wrappedB = destination.createToken(address(tokenB), 'Wrapped Baryonyx', 'wBYNX');
+		vm.stopPrank();
+
+		// Lock some of the user's tokens in the source contract so there is something to withdraw
+		vm.startPrank(user);
+		tokenA.approve(address(source), 2**60);
+		tokenB.approve(address(source), 2**60);
+		source.deposit(address(tokenA), user, 2**60);
+		source.deposit(address(tokenB), user, 2**60);
+		vm.stopPrank();
+	}
+
+	function batch(address t0, address t1, address r0, address r1, uint256 a0, uint256 a1) internal pure returns (address[] memory tokens, address[] memory recipients, uint256[] memory amounts) {
+		tokens = new address[](2);
+		recipients = new address[](2);
+		amounts = new uint256[](2);
+		tokens[0] = t0;
+		tokens[1] = t1;
+		recipients[0] = r0;
+		recipients[1] = r1;
+		amounts[0] = a0;
+		amounts[1] = a1;
+	}
+
+	function testWrapBatch(address recipientA, address recipientB, uint256 amtA, uint256 amtB) public {
+		vm.assume( recipientA != address(0) );
+		vm.assume( recipientB != address(0) );
+		vm.assume( recipientA != recipientB );
+		amtA = amtA % 2**128;
+		amtB = amtB % 2**128;
+
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(tokenB), recipientA, recipientB, amtA, amtB);
+
+		vm.expectEmit(true, true, true, true);
+		emit Wrap( address(tokenA), wrappedA, recipientA, amtA );
+		vm.expectEmit(true, true, true, true);
+		emit Wrap( address(tokenB), wrappedB, recipientB, amtB );
+		vm.prank(admin);
+		destination.wrapBatch(tokens, recipients, amounts);
+
+		assertEq( ERC20(wrappedA).balanceOf(recipientA), amtA );
+		assertEq( ERC20(wrappedB).balanceOf(recipientB), amtB );
+	}
+
+	function testWrapBatchMatchesWrap(address recipient, uint256 amt) public {
+		vm.assume( recipient != address(0) );
+		amt = amt % 2**128;
+
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(tokenA), recipient, recipient, amt, amt);
+
+		vm.startPrank(admin);
+		destination.wrap(address(tokenA), recipient, amt);
+		destination.wrap(address(tokenA), recipient, amt);
+		uint256 viaWrap = ERC20(wrappedA).balanceOf(recipient);
+		destination.wrapBatch(tokens, recipients, amounts);
+		vm.stopPrank();
+
+		assertEq( ERC20(wrappedA).balanceOf(recipient), 2*viaWrap );
+	}
+
+	function testUnauthorizedWrapBatch(address caller) public {
+		vm.assume( caller != admin );
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(tokenB), user, user, 1, 1);
+
+		vm.expectRevert();
+		vm.prank(caller);
+		destination.wrapBatch(tokens, recipients, amounts);
+	}
+
+	function testWrapBatchUnsupportedTokenReverts() public {
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(0xdead), user, user, 1, 1);
+
+		vm.expectRevert("Destination: Underlying token not supported");
+		vm.prank(admin);
+		destination.wrapBatch(tokens, recipients, amounts);
+		assertEq( ERC20(wrappedA).balanceOf(user), 0 );
+	}
+
+	function testWrapBatchLengthMismatch() public {
+		address[] memory tokens = new address[](2);
+		address[] memory recipients = new address[](1);
+		uint256[] memory amounts = new uint256[](2);
+
+		vm.expectRevert("Destination: Array length mismatch");
+		vm.prank(admin);
+		destination.wrapBatch(tokens, recipients, amounts);
+	}
+
+	function testWithdrawBatch(address recipientA, address recipientB, uint256 amtA, uint256 amtB) public {
+		vm.assume( recipientA != address(0) && recipientA != address(source) );
+		vm.assume( recipientB != address(0) && recipientB != address(source) );
+		amtA = amtA % 2**60;
+		amtB = amtB % 2**60;
+
+		uint256 prevA = tokenA.balanceOf(recipientA);
+		uint256 prevB = tokenB.balanceOf(recipientB);
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(tokenB), recipientA, recipientB, amtA, amtB);
+
+		vm.expectEmit(true, true, false, true);
+		emit Withdrawal( address(tokenA), recipientA, amtA );
+		vm.expectEmit(true, true, false, true);
+		emit Withdrawal( address(tokenB), recipientB, amtB );
+		vm.prank(admin);
+		source.withdrawBatch(tokens, recipients, amounts);
+
+		assertEq( tokenA.balanceOf(recipientA), prevA + amtA );
+		assertEq( tokenB.balanceOf(recipientB), prevB + amtB );
+		assertEq( tokenA.balanceOf(address(source)), 2**60 - amtA );
+		assertEq( tokenB.balanceOf(address(source)), 2**60 - amtB );
+	}
+
+	function testUnauthorizedWithdrawBatch(address caller) public {
+		vm.assume( caller != admin );
+		(address[] memory tokens, address[] memory recipients, uint256[] memory amounts) = batch(address(tokenA), address(tokenB), caller, caller, 1, 1);
+
+		vm.expectRevert();
+		vm.prank(caller);
+		source.withdrawBatch(tokens, recipients, amounts);
+	}
+
+	function testWithdrawBatchLengthMismatch() public {
+		address[] memory tokens = new address[](1);
+		address[] memory recipients = new address[](2);
+		uint256[] memory amounts = new uint256[](2);
+
+		vm.expectRevert("Source: Array length mismatch");
+		vm.prank(admin);
+		source.withdrawBatch(tokens, recipients, amounts);
+	}
+}
@@ -24,6 +24,19 @@ contract Destination is AccessControl {
   }
 
 	function wrap(address _underlying_token, address _recipient, uint256 _amount ) public onlyRole(WARDEN_ROLE) {
+		_wrap(_underlying_token, _recipient, _amount);
+	}
+
+	function wrapBatch(address[] calldata _underlying_tokens, address[] calldata _recipients, uint256[] calldata _amounts ) public onlyRole(WARDEN_ROLE) {
+		// One entry per deposit being bridged; the whole batch reverts if any entry does
+    require(_underlying_tokens.length == _recipients.length && _recipients.length == _amounts.length, "Destination: Array length mismatch");
+
+		for( uint256 i = 0; i < _underlying_tokens.length; i++ ) {
+			_wrap(_underlying_tokens[i], _recipients[i], _amounts[i]);
+		}
+	}
+
+	function _wrap(address _underlying_token, address _recipient, uint256 _amount ) internal {
 		// Look up the wrapped token address corresponding to the underlying token
     address wrappedTokenAddress = wrapped_tokens[_underlying_token];
 		
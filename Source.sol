@@ -36,10 +36,26 @@ contract Source is AccessControl {
 	function withdraw(address _token, address _recipient, uint256 _amount ) onlyRole(WARDEN_ROLE) public {
 		// 1. Permission check is already done by onlyRole(WARDEN_ROLE) modifier
 		
-		// 2. Use transfer to push tokens to the recipient
+		// 2. Push the tokens to the recipient and emit the Withdrawal event
+		_withdraw(_token, _recipient, _amount);
+	}
+
+	function withdrawBatch(address[] calldata _tokens, address[] calldata _recipients, uint256[] calldata _amounts ) onlyRole(WARDEN_ROLE) public {
+		// 1. Permission check is already done by onlyRole(WARDEN_ROLE) modifier
+		
+		// 2. One entry per unwrap being bridged back; the whole batch reverts if any entry does
+		require(_tokens.length == _recipients.length && _recipients.length == _amounts.length, "Source: Array length mismatch");
+		
+		for( uint256 i = 0; i < _tokens.length; i++ ) {
+			_withdraw(_tokens[i], _recipients[i], _amounts[i]);
+		}
+	}
+
+	function _withdraw(address _token, address _recipient, uint256 _amount ) internal {
+		// Use transfer to push tokens to the recipient
 		IERC20(_token).transfer(_recipient, _amount);
 		
-		// 3. Emit Withdrawal event
+		// Emit Withdrawal event
 		emit Withdrawal(_token, _recipient, _amount);
 	}
 
@@ -0,0 +1,221 @@
+#!/bin/python
+"""
+Off-chain quotes and simulations of AMM/src/AMM.sol
+
+trade() reproduces AMM.tradeTokens step for step in exact integer
+arithmetic (NumPy object arrays of Python ints, so uint256 values never
+overflow or round):
+
+    sellAfterFee = sell * (10000 - feebps) / 10000
+    buy          = balanceOut - invariant / (balanceIn + sellAfterFee)
+    newInvariant = (balanceIn + sell) * (balanceOut - buy)
+
+and reports, for every element, the outcome the contract would have,
+including the reverts (STATUS_REASONS), so thousands of trade sizes can be
+quoted in one call. simulate() applies sequences of trades to pools
+batch-wise: one NumPy step per trade position, vectorised over sequences.
+
+    python amm_sim.py -o AMM/test/fixtures/amm_quotes.json
+
+writes the fixture AMM/test/AMMQuote.t.sol replays against the contract.
+"""
+import argparse
+import json
+import random
+
+import numpy as np
+
+# AMM.feebps and its denominator
+FEE_BPS = 3
+BPS = 10000
+UINT256_MAX = 2**256 - 1
+
+# Outcome of a trade
+OK = 0
+BAD_TRADE = 1       # require( new_invariant >= invariant, 'Bad trade' )
+UNDERFLOW = 2       # invariant / (balanceIn + sellAmountAfterFee) > balanceOut
+OVERFLOW = 3        # an intermediate value exceeds uint256
+ZERO_TRADE = 4      # require( sellAmount > 0, 'Cannot trade 0' )
+NO_LIQUIDITY = 5    # require( invariant > 0, 'Invariant must be nonzero' )
+DIVISION_BY_ZERO = 6  # balanceIn + sellAmountAfterFee == 0
+STATUS_REASONS = {
+    OK: None,
+    BAD_TRADE: 'Bad trade',
+    UNDERFLOW: 'arithmetic underflow',
+    OVERFLOW: 'arithmetic overflow',
+    ZERO_TRADE: 'Cannot trade 0',
+    NO_LIQUIDITY: 'Invariant must be nonzero',
+    DIVISION_BY_ZERO: 'division by zero',
+}
+
+# Which token a trade sells
+SELL_A = 0
+SELL_B = 1
+
+DEFAULT_FIXTURE = "AMM/test/fixtures/amm_quotes.json"
+
+
+def as_uint(values):
+    """
+    values as a NumPy object array of Python ints
+    """
+    arr = np.asarray(values, dtype=object)
+    return np.vectorize(int, otypes=[object])(arr) if arr.size else arr
+
+
+def trade(balance_in, balance_out, invariant, sell, fee_bps=FEE_BPS):
+    """
+    Outcome of tradeTokens selling sell of the token the pool holds
+    balance_in of. All arguments broadcast against each other.
+
+    Returns (buy, new_balance_in, new_balance_out, new_invariant, status)
+    as arrays; for reverted trades (status != OK) buy is 0 and the pool is
+    returned unchanged
+    """
+    balance_in, balance_out, invariant, sell = np.broadcast_arrays(
+        as_uint(balance_in), as_uint(balance_out), as_uint(invariant), as_uint(sell))
+    status = np.full(sell.shape, OK, dtype=np.int8)
+
+    scaled = sell * (BPS - fee_bps)
+    status[scaled > UINT256_MAX] = OVERFLOW
+    after_fee = scaled // BPS
+    denominator = balance_in + after_fee
+    status[(status == OK) & (denominator > UINT256_MAX)] = OVERFLOW
+    status[(status == OK) & (denominator == 0)] = DIVISION_BY_ZERO
+    quotient = invariant // np.where(denominator == 0, 1, denominator)
+    status[(status == OK) & (quotient > balance_out)] = UNDERFLOW
+    buy = balance_out - quotient
+
+    new_in = balance_in + sell
+    new_out = quotient
+    new_invariant = new_in * new_out
+    status[(status == OK) & ((new_in > UINT256_MAX) | (new_invariant > UINT256_MAX))] = OVERFLOW
+    status[(status == OK) & (new_invariant < invariant)] = BAD_TRADE
+    # Checked in this order by the contract, so they take precedence
+    status[sell == 0] = ZERO_TRADE
+    status[invariant == 0] = NO_LIQUIDITY
+
+    ok = status == OK
+    return (np.where(ok, buy, 0),
+            np.where(ok, new_in, balance_in),
+            np.where(ok, new_out, balance_out),
+            np.where(ok, new_invariant, invariant),
+            status)
+
+
+def quote(balance_a, balance_b, sells, side=SELL_A, invariant=None, fee_bps=FEE_BPS):
+    """
+    Quotes many trade sizes against one pool (balances of the AMM contract
+    and its invariant, balance_a * balance_b by default).
+
+    Returns {'buy', 'status', 'slippage'}: the amount received, the outcome
+    (see STATUS_REASONS) and the shortfall of buy against the spot price
+    before the trade (float, 0.0 for a reverted trade)
+    """
+    if invariant is None:
+        invariant = balance_a * balance_b
+    balance_in, balance_out = (balance_a, balance_b) if side == SELL_A else (balance_b, balance_a)
+    sells = as_uint(sells)
+    buy, _, _, _, status = trade(balance_in, balance_out, invariant, sells, fee_bps)
+
+    ideal = sells.astype(float) * (balance_out / balance_in) if balance_in else np.zeros(sells.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slippage = np.where((status == OK) & (ideal > 0), 1.0 - buy.astype(float) / ideal, 0.0)
+    return {'buy': buy, 'status': status, 'slippage': slippage}
+
+
+def simulate(balance_a, balance_b, sides, sells, invariant=None, fee_bps=FEE_BPS):
+    """
+    Applies sequences of trades to pools.
+
+        balance_a, balance_b, invariant - starting pool of each sequence
+                                          (scalars or arrays of shape (n,))
+        sides, sells - (n, steps) (or (steps,) for a single sequence) arrays
+                       of SELL_A / SELL_B and sell amounts
+
+    A reverted trade leaves its pool unchanged, as the reverted transaction
+    would. Returns {'buy', 'status', 'balance_a', 'balance_b', 'invariant'},
+    the first two per trade and the rest the pools after each trade
+    """
+    sides = np.asarray(sides)
+    sells = as_uint(sells)
+    single = sells.ndim == 1
+    if single:
+        sides, sells = sides[None, :], sells[None, :]
+    n, steps = sells.shape
+
+    bal_a = np.broadcast_to(as_uint(balance_a), (n,)).copy()
+    bal_b = np.broadcast_to(as_uint(balance_b), (n,)).copy()
+    inv = bal_a * bal_b if invariant is None else np.broadcast_to(as_uint(invariant), (n,)).copy()
+
+    out = {key: np.empty((n, steps), dtype=object) for key in ('buy', 'balance_a', 'balance_b', 'invariant')}
+    out['status'] = np.empty((n, steps), dtype=np.int8)
+    for step in range(steps):
+        sell_a = sides[:, step] == SELL_A
+        buy, new_in, new_out, inv, status = trade(np.where(sell_a, bal_a, bal_b), np.where(sell_a, bal_b, bal_a),
+                                                  inv, sells[:, step], fee_bps)
+        bal_a = np.where(sell_a, new_in, new_out)
+        bal_b = np.where(sell_a, new_out, new_in)
+        out['buy'][:, step] = buy
+        out['status'][:, step] = status
+        out['balance_a'][:, step] = bal_a
+        out['balance_b'][:, step] = bal_b
+        out['invariant'][:, step] = inv
+
+    if single:
+        out = {key: value[0] for key, value in out.items()}
+    return out
+
+
+def make_fixture(balance_a, balance_b, steps, seed=0):
+    """
+    A random trade sequence against a pool, with the outcome of every trade.
+    Sizes are spread log-uniformly from 1 unit to twice the pool, plus zero
+    trades; every value stays below 2**53 so JSON readers keep it exact
+    """
+    rng = random.Random(seed)
+    sides = [rng.randrange(2) for _ in range(steps)]
+    sells = []
+    for side in sides:
+        if rng.random() < 0.05:
+            sells.append(0)
+        else:
+            pool = balance_a if side == SELL_A else balance_b
+            sells.append(min(int(2 ** rng.uniform(0, (2 * pool).bit_length())), 2 * pool))
+    result = simulate(balance_a, balance_b, sides, sells)
+    fixture = {
+        'balanceA': balance_a,
+        'balanceB': balance_b,
+        'feeBps': FEE_BPS,
+        'sides': sides,
+        'sellAmounts': sells,
+        'buyAmounts': [int(v) for v in result['buy']],
+        'statuses': [int(v) for v in result['status']],
+        'balancesA': [int(v) for v in result['balance_a']],
+        'balancesB': [int(v) for v in result['balance_b']],
+    }
+    largest = max(max(v) if isinstance(v, list) and v else v for v in fixture.values())
+    assert largest < 2**53, "fixture values must stay below 2**53"
+    return fixture
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the AMM quote fixture used by AMM/test/AMMQuote.t.sol")
+    parser.add_argument('-a', '--balance-a', type=int, default=2**40)
+    parser.add_argument('-b', '--balance-b', type=int, default=2**40)
+    parser.add_argument('-n', '--steps', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=DEFAULT_FIXTURE)
+    args = parser.parse_args(argv)
+
+    fixture = make_fixture(args.balance_a, args.balance_b, args.steps, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(fixture, f, indent=1)
+        f.write('\n')
+    counts = np.bincount(fixture['statuses'], minlength=len(STATUS_REASONS))
+    summary = ', '.join(f"{STATUS_REASONS[status] or 'ok'}: {count}" for status, count in enumerate(counts) if count)
+    print(f"Wrote {args.steps} trades to {args.output} ({summary})")
+
+
+if __name__ == '__main__':
+    main()
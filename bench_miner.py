@@ -0,0 +1,197 @@
+#!/bin/python
+"""
+Hashrate benchmark for findBlockNonce.mine_block
+
+Runs the miner over a grid of difficulties, transaction counts and
+transaction sizes and writes the results as JSON so runs on different
+commits can be compared, e.g.
+
+    python bench_miner.py -k 8,12,16 -n 1,10,100 -s 32,256 -o bench.json
+    python bench_miner.py -k 16 --profile miner.prof
+"""
+import argparse
+import cProfile
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import findBlockNonce
+
+# Difficulty used for the fixed-length kernel runs; no digest has this
+# many trailing zero bits, so the kernel hashes every nonce it is given
+NO_SOLUTION_K = 256
+
+
+def load_corpus(filename):
+    """
+    Returns the text of filename as one string (lines joined by spaces),
+    the raw material transactions are cut from
+    """
+    with open(filename, 'r') as f:
+        return ' '.join(line.strip() for line in f)
+
+
+def make_transactions(corpus, count, size, rng):
+    """
+    Returns count transactions of size characters each, cut from random
+    offsets of the corpus (wrapping around its end)
+    """
+    text = corpus * (size // len(corpus) + 2)
+    txs = []
+    for _ in range(count):
+        start = rng.randrange(len(corpus))
+        txs.append(text[start:start + size])
+    return txs
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure_kernel(prev_hash, transactions, hashes):
+    """
+    Runs the mining kernel over exactly "hashes" nonces and returns
+    (hashes per second, peak bytes allocated).
+
+    The peak comes from tracemalloc in a second, separate pass so the
+    tracing overhead does not distort the timing. It is the highest traced
+    memory above the starting point over the whole run, not a per-hash
+    figure: tracemalloc only sees live blocks, so the number of
+    allocations made per hash is not measured
+    """
+    prefix = findBlockNonce._prefix_state(prev_hash, transactions)
+    t0 = time.perf_counter()
+    findBlockNonce._search_nonces(prefix, NO_SOLUTION_K, 0, hashes)
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    findBlockNonce._search_nonces(prefix, NO_SOLUTION_K, 0, hashes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return hashes / elapsed if elapsed else float('inf'), peak - base
+
+
+def run_cell(k, count, size, corpus, trials, workers, kernel_hashes, rng, profiler=None):
+    """
+    Mines "trials" blocks with the given parameters and returns a dict of
+    statistics for this point of the grid
+    """
+    times = []
+    hashes = 0
+    for trial in range(trials):
+        prev_hash = hashlib.sha256(rng.randbytes(32)).digest()
+        txs = make_transactions(corpus, count, size, rng)
+        if profiler is not None:
+            profiler.enable()
+        t0 = time.perf_counter()
+        nonce = findBlockNonce.mine_block(k, prev_hash, txs, workers=workers)
+        times.append(time.perf_counter() - t0)
+        if profiler is not None:
+            profiler.disable()
+        # The smallest valid nonce n is only found after trying 0 .. n
+        hashes += int.from_bytes(nonce, 'big') + 1
+
+    prev_hash = hashlib.sha256(b'kernel').digest()
+    kernel_rate, peak_alloc = measure_kernel(
+        prev_hash, make_transactions(corpus, count, size, rng), kernel_hashes)
+
+    total = sum(times)
+    return {
+        'k': k,
+        'tx_count': count,
+        'tx_size': size,
+        'workers': workers,
+        'trials': trials,
+        'hashes': hashes,
+        'hashes_per_sec': hashes / total if total else None,
+        'kernel_hashes_per_sec': kernel_rate,
+        'time_to_solution': {
+            'mean': total / trials,
+            'p50': percentile(times, 50),
+            'p90': percentile(times, 90),
+            'p99': percentile(times, 99),
+            'max': max(times),
+        },
+        'peak_alloc_bytes': peak_alloc,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark findBlockNonce.mine_block")
+    parser.add_argument('-k', '--difficulties', type=int_list, default=[8, 12, 16])
+    parser.add_argument('-n', '--tx-counts', type=int_list, default=[1, 10, 100])
+    parser.add_argument('-s', '--tx-sizes', type=int_list, default=[32, 256])
+    parser.add_argument('-t', '--trials', type=int, default=5)
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--kernel-hashes', type=int, default=50000,
+                        help="nonces per fixed-length kernel run")
+    parser.add_argument('--corpus', default='bitcoin_text.txt')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench_miner.json')
+    parser.add_argument('--profile', metavar='FILE',
+                        help="dump a cProfile of all mining runs to FILE")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus(args.corpus)
+    profiler = cProfile.Profile() if args.profile else None
+
+    results = []
+    for k in args.difficulties:
+        for count in args.tx_counts:
+            for size in args.tx_sizes:
+                cell = run_cell(k, count, size, corpus, args.trials, args.workers,
+                                args.kernel_hashes, rng, profiler)
+                results.append(cell)
+                print(f"k={k:3d} txs={count:5d} size={size:6d}  "
+                      f"{cell['hashes_per_sec']:12.0f} H/s  "
+                      f"p50={cell['time_to_solution']['p50']:.4f}s  "
+                      f"p90={cell['time_to_solution']['p90']:.4f}s  "
+                      f"peak alloc={cell['peak_alloc_bytes']} B")
+
+    report = {
+        'commit': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f"Wrote profile to {args.profile}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/bin/python
+"""
+Throughput benchmark for signer.ChallengeSigner
+
+Signs and verifies random challenges with a fresh key and reports
+signatures per second for each worker count, e.g.
+
+    python bench_signer.py -n 2000 -w 1,4 --verify
+"""
+import argparse
+import os
+import time
+
+import eth_account
+
+from signer import ChallengeSigner, verify_many
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark signer.ChallengeSigner")
+    parser.add_argument('-n', '--count', type=int, default=2000, help="challenges per run")
+    parser.add_argument('-w', '--workers', type=int_list, default=[1, os.cpu_count() or 1])
+    parser.add_argument('-s', '--size', type=int, default=64, help="challenge length in bytes")
+    parser.add_argument('--text', action='store_true', help="sign hex strings instead of bytes")
+    parser.add_argument('--verify', action='store_true', help="self-check every signature")
+    args = parser.parse_args(argv)
+
+    challenges = [os.urandom(args.size) for _ in range(args.count)]
+    if args.text:
+        challenges = [c.hex() for c in challenges]
+    signer = ChallengeSigner(eth_account.Account.create().key.hex(), verify=args.verify)
+
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        signed = signer.sign_many(challenges, workers=workers)
+        sign_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ok = verify_many(challenges, [s.signature for s in signed], signer.address, workers=workers)
+        verify_time = time.perf_counter() - t0
+        assert all(ok), "signature did not verify"
+
+        print(f"workers={workers:3d}  sign {args.count / sign_time:10.0f} sig/s  "
+              f"verify {args.count / verify_time:10.0f} sig/s")
+
+
+if __name__ == '__main__':
+    main()
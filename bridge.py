@@ -1,33 +1,309 @@
 from web3 import Web3
 from web3.providers.rpc import HTTPProvider
-from web3.middleware import ExtraDataToPOAMiddleware
 from datetime import datetime
-import json
-import pandas as pd
+import asyncio
+from web3.exceptions import TransactionNotFound
+from chain_clients import get_async_w3, get_contract, get_w3, load_contract_info
+from bridge_state import BridgeState, event_key
+from follower import POLL_INTERVAL, BlockFollower
+from log_decoder import get_decoder
+from log_fetcher import fetch_logs
+from nonce_manager import get_nonce_manager, next_nonce, replace_stuck
+from tx_builder import get_tx_builder
+
+# Relay transactions (sent but not yet confirmed) allowed at once in scan_blocks_async
+MAX_IN_FLIGHT = 8
+# Relay events in wrapBatch / withdrawBatch calls. These need the upgraded
+# Destination.sol / Source.sol; only turn this on once they are deployed
+# at the addresses in contract_info.json
+BATCH_RELAY = False
+# Most events relayed by a single wrapBatch / withdrawBatch call
+MAX_BATCH_SIZE = 50
+# Gas limit of a single wrap / withdraw. Not estimated: the estimate of a call
+# that would revert raises, and the event would then never be sent, while a
+# mined revert is recorded as failed and scanning moves on. Headroom added to
+# batch gas estimates
+RELAY_GAS = 300000
+BATCH_GAS_MARGIN = 1.2
+# SQLite file with the scan checkpoints and the processed-event store
+STATE_DB = "bridge_state.db"
+# Blocks per eth_getLogs request when catching up
+CATCHUP_CHUNK = 2000
 
 
 def connect_to(chain):
-    if chain == 'source':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc"
-    if chain == 'destination':
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/"
+    # 'source' is avax and 'destination' is bsc; the client is shared
+    # process-wide (see chain_clients)
     if chain in ['source','destination']:
-        w3 = Web3(Web3.HTTPProvider(api_url))
-        w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-    return w3
+        return get_w3(chain)
 
 
 def get_contract_info(chain, contract_info):
     try:
-        with open(contract_info, 'r')  as f:
-            contracts = json.load(f)
+        contracts = load_contract_info(contract_info)
     except Exception as e:
         print( f"Failed to read contract info\nPlease contact your instructor\n{e}" )
         return 0
     return contracts[chain]
 
 
-def scan_blocks(chain, contract_info="contract_info.json"):
+def relay_call(chain, event):
+    """
+    The call that relays an event seen on chain: a Deposit on the source
+    chain becomes wrap() on the destination, an Unwrap on the destination
+    becomes withdraw() on the source. Returns (function name, args)
+    """
+    args = event['args']
+    if chain == 'source':
+        return 'wrap', (args['token'], args['recipient'], args['amount'])
+    return 'withdraw', (args['underlying_token'], args['to'], args['amount'])
+
+
+def batch_abi(name, token_arg):
+    return {
+        'type': 'function',
+        'name': name,
+        'inputs': [
+            {'name': token_arg, 'type': 'address[]', 'internalType': 'address[]'},
+            {'name': '_recipients', 'type': 'address[]', 'internalType': 'address[]'},
+            {'name': '_amounts', 'type': 'uint256[]', 'internalType': 'uint256[]'},
+        ],
+        'outputs': [],
+        'stateMutability': 'nonpayable',
+    }
+
+
+# ABI entries of the batch entry points, added to the ABI in contract_info.json
+# (which describes the deployed contracts) when batching is on
+BATCH_ABI = {
+    'destination': [batch_abi('wrapBatch', '_underlying_tokens')],
+    'source': [batch_abi('withdrawBatch', '_tokens')],
+}
+
+
+def send_relay_tx(target, fn, gas, warden_account):
+    """
+    Builds, signs and sends the contract call fn on chain target with the
+    next local nonce of the warden, with gas limit gas. Returns (nonce
+    manager, nonce, tx hash), or None if the transaction could not be sent
+    """
+    target_w3 = connect_to(target)
+    builder = get_tx_builder(target, warden_account)
+    nonces = nonce = None
+    try:
+        nonces, nonce = next_nonce(target_w3, target, warden_account.address)
+        tx = builder.build(fn, nonce, gas)
+        tx_hash = target_w3.eth.send_raw_transaction(builder.sign(tx))
+    except Exception as e:
+        if nonces is not None:
+            nonces.failed(nonce, e)
+        print(f"Error calling {fn.fn_name}(): {e}")
+        return None
+    nonces.sent(nonce, tx_hash, tx)
+    return nonces, nonce, tx_hash
+
+
+def replace_stuck_relays(target, warden_account, state=None):
+    """
+    Replaces the warden's stuck transactions on chain target (see
+    nonce_manager.replace_stuck) and points the events they relay at the
+    replacements
+    """
+    for _, old_tx, new_tx in replace_stuck(connect_to(target), target, warden_account):
+        if state is not None:
+            state.replace_tx(old_tx, new_tx)
+
+
+def find_receipt(w3, tx_hashes):
+    """
+    Receipt of the first of tx_hashes that was mined, or None
+    """
+    for tx_hash in tx_hashes:
+        try:
+            return w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            continue
+    return None
+
+
+def settle_relays(chain, state):
+    """
+    Looks up the receipts of the relay transactions of chain's events that
+    were sent but not seen mined, and settles their events (see
+    BridgeState.settle). A replaced relay transaction is settled by the
+    receipt of whichever transaction of its nonce was mined. Returns the
+    block numbers of events released for another relay attempt
+    """
+    target_w3 = connect_to('destination' if chain == 'source' else 'source')
+    released = []
+    for relay_tx in state.unconfirmed(chain):
+        try:
+            receipt = find_receipt(target_w3, state.relay_txs(relay_tx))
+        except Exception as e:
+            print(f"Error looking up relay transaction {relay_tx}: {e}")
+            continue
+        if receipt is None:
+            # Not mined yet (or dropped): its events are never relayed again
+            # automatically, as it may still be mined
+            continue
+        released.extend(state.settle(chain, relay_tx, receipt['status'] == 1))
+    return released
+
+
+def record_relays(chain, state, events, statuses):
+    """
+    Stores the outcome of relay_events in the processed-event store.
+    Returns the events whose relay transaction was never sent
+    """
+    state.mark_done(chain, [e for e, s in zip(events, statuses) if s == 'done'])
+    state.mark_failed(chain, [e for e, s in zip(events, statuses) if s == 'failed'])
+    return [e for e, s in zip(events, statuses) if s == 'error']
+
+
+def relay_events(chain, events, warden_account, contract_info="contract_info.json", max_batch_size=MAX_BATCH_SIZE,
+                 batch_calls=None, state=None):
+    """
+    Relays events seen on chain to the other chain.
+
+    If batch_calls is set (default: BATCH_RELAY), events are grouped into
+    wrapBatch / withdrawBatch calls of up to max_batch_size entries. A
+    batch that fails gas estimation (i.e. would revert) or is mined with
+    status 0 is relayed again one call per event; a batch whose receipt
+    did not arrive is not, as it may still be mined. All transactions are
+    sent back to back, with nonces from the warden's local nonce manager,
+    and only then are their receipts awaited. Earlier warden transactions
+    stuck unmined are replaced first (see nonce_manager).
+
+    With a BridgeState, the relay transaction of each event is recorded
+    (mark_sent) as soon as it is broadcast, before its receipt is awaited.
+
+    Returns one status per event: 'done' (relayed), 'failed' (its relay
+    transaction was mined and reverted), 'sent' (broadcast, no receipt
+    seen) or 'error' (not sent)
+    """
+    statuses = ['error'] * len(events)
+    if not events:
+        return statuses
+    target = 'destination' if chain == 'source' else 'source'
+    target_data = get_contract_info(target, contract_info)
+    if not target_data:
+        return statuses
+    target_w3 = connect_to(target)
+    if batch_calls is None:
+        batch_calls = BATCH_RELAY
+    abi = target_data['abi'] + BATCH_ABI[target] if batch_calls else target_data['abi']
+    target_contract = get_contract(target, target_data['address'], abi)
+    builder = get_tx_builder(target, warden_account)
+    replace_stuck_relays(target, warden_account, state)
+
+    # (function name, args, index of the event)
+    calls = []
+    for i, event in enumerate(events):
+        name, args = relay_call(chain, event)
+        print(f"Found {event['event']} event: token={args[0]}, recipient={args[1]}, amount={args[2]}")
+        calls.append((name, args, i))
+
+    def record_sent(items, tx):
+        for _, _, i in items:
+            statuses[i] = 'sent'
+        if state is not None:
+            state.mark_sent(chain, [events[i] for _, _, i in items], tx[2])
+
+    def send_single(items):
+        out = []
+        for name, args, i in items:
+            tx = send_relay_tx(target, target_contract.functions[name](*args), RELAY_GAS, warden_account)
+            if tx is not None:
+                record_sent([(name, args, i)], tx)
+                out.append(([(name, args, i)], tx))
+        return out
+
+    def confirm(items, tx):
+        """
+        True if tx was mined and succeeded, False if it was mined and
+        reverted, None if no receipt arrived
+        """
+        nonces, nonce, tx_hash = tx
+        label = items[0][0] + ('Batch' if len(items) > 1 else '')
+        try:
+            tx_receipt = target_w3.eth.wait_for_transaction_receipt(tx_hash)
+        except Exception as e:
+            print(f"Error waiting for {label}() transaction {tx_hash.hex()}: {e}")
+            return None
+        nonces.confirmed(nonce)
+        ok = tx_receipt['status'] == 1
+        print(f"{label[0].upper() + label[1:]} transaction {'successful' if ok else 'failed'}: {tx_hash.hex()}")
+        for _, _, i in items:
+            statuses[i] = 'done' if ok else 'failed'
+        return ok
+
+    step = max(1, max_batch_size)
+    sent = []
+    for start in range(0, len(calls), step):
+        batch = calls[start:start + step]
+        if len(batch) == 1 or not batch_calls:
+            sent.extend(send_single(batch))
+            continue
+        name = batch[0][0] + 'Batch'
+        fn = target_contract.functions[name](*(list(column) for column in zip(*(args for _, args, _ in batch))))
+        try:
+            # Estimated afresh for every batch: a failing estimate is how a batch that would revert is caught
+            gas = builder.estimate_gas(fn, BATCH_GAS_MARGIN, memoize=False)
+        except Exception as e:
+            print(f"{name}() of {len(batch)} events would revert, relaying them one by one: {e}")
+            sent.extend(send_single(batch))
+            continue
+        tx = send_relay_tx(target, fn, gas, warden_account)
+        if tx is None:
+            sent.extend(send_single(batch))
+        else:
+            record_sent(batch, tx)
+            sent.append((batch, tx))
+
+    retry = []
+    for items, tx in sent:
+        if confirm(items, tx) is False and len(items) > 1:
+            print(f"Relaying the {len(items)} events of the reverted batch one by one")
+            for _, _, i in items:
+                statuses[i] = 'error'
+            if state is not None:
+                state.unsend(chain, [events[i] for _, _, i in items])
+            retry.extend(items)
+    for items, tx in send_single(retry):
+        confirm(items, tx)
+    return statuses
+
+
+def fetch_events(w3, contract, event_name, from_block, to_block, chunk_size=CATCHUP_CHUNK,
+                 contract_info="contract_info.json"):
+    """
+    Decoded event_name events of contract in blocks from_block .. to_block
+    in (block, log index) order, requested in windows starting at chunk_size
+    blocks (see log_fetcher)
+    """
+    decoder = get_decoder(contract_info)
+    logs = fetch_logs(w3, {'address': contract.address, 'topics': [decoder.topic(event_name)]},
+                      from_block, to_block, window=chunk_size)
+    return decoder.decode_many(logs)
+
+
+def scan_blocks(chain, contract_info="contract_info.json", state_db=STATE_DB, chunk_size=CATCHUP_CHUNK):
+    """
+    Relays the Deposit (source) or Unwrap (destination) events that have
+    not been relayed yet.
+
+    Scanning resumes from the checkpoint stored in state_db (the last 5
+    blocks on the first run), so blocks missed while the bridge was down
+    are caught up in chunk_size block requests. Events are claimed in the
+    processed-event store before they are relayed, which makes repeated
+    and overlapping runs idempotent.
+
+    Relay transactions sent by earlier runs whose receipt was not seen are
+    settled first by looking up their receipts; they are never sent again.
+    An event whose relay transaction reverted is marked failed and not
+    retried. Only events whose relay transaction could not be sent at all
+    hold the checkpoint back, so they are rescanned and retried next run
+    """
     if chain not in ['source','destination']:
         print( f"Invalid chain: {chain}" )
         return 0
@@ -40,11 +316,7 @@ def scan_blocks(chain, contract_info="contract_info.json"):
     contract_abi = contract_data['abi']
     
     w3 = connect_to(chain)
-    contract = w3.eth.contract(address=contract_address, abi=contract_abi)
-    
-    latest_block = w3.eth.block_number
-    from_block = max(0, latest_block - 4)
-    to_block = latest_block
+    contract = get_contract(chain, contract_address, contract_abi)
     
     import os
     warden_private_key = os.getenv('PRIVATE_KEY')
@@ -54,123 +326,221 @@ def scan_blocks(chain, contract_info="contract_info.json"):
     
     from eth_account import Account
     warden_account = Account.from_key(warden_private_key)
-    warden_address = warden_account.address
-    
-    if chain == 'source':
-        # 使用 web3.py 的正确方式获取事件日志
-        event_filter = contract.events.Deposit.build_filter()
-        event_filter.fromBlock = from_block
-        event_filter.toBlock = to_block
-        
-        try:
-            deposit_events = event_filter.deploy(w3).get_all_entries()
-        except:
-            # 备用方法：直接使用 getLogs
+
+    event_name = 'Deposit' if chain == 'source' else 'Unwrap'
+    with BridgeState(state_db) as state:
+        released = settle_relays(chain, state)
+        latest_block = w3.eth.block_number
+        checkpoint = state.get_checkpoint(chain, contract_address)
+        from_block = max(0, latest_block - 4) if checkpoint is None else checkpoint + 1
+        if released:
+            # Events of reverted batches, to be relayed again
+            from_block = min(from_block, min(released))
+        if from_block > latest_block:
+            # Already up to date
+            return 1
+        if latest_block - from_block > 4:
+            print(f"Catching up on {chain}: blocks {from_block} - {latest_block}")
+
+        # Lowest block with an event that could not be sent in this run
+        unsent_block = None
+        for start in range(from_block, latest_block + 1, chunk_size):
+            end = min(start + chunk_size - 1, latest_block)
             try:
-                deposit_events = w3.eth.get_logs({
-                    'fromBlock': from_block,
-                    'toBlock': to_block,
-                    'address': contract_address,
-                    'topics': [w3.keccak(text="Deposit(address,address,uint256)").hex()]
-                })
-                # 解析事件
-                deposit_events = [contract.events.Deposit().process_log(log) for log in deposit_events]
+                events = fetch_events(w3, contract, event_name, start, end, chunk_size, contract_info)
             except Exception as e:
-                print(f"No Deposit events found or error: {e}")
-                deposit_events = []
-        
-        for event in deposit_events:
-            token = event['args']['token']
-            recipient = event['args']['recipient']
-            amount = event['args']['amount']
-            
-            print(f"Found Deposit event: token={token}, recipient={recipient}, amount={amount}")
-            
-            dest_contract_data = get_contract_info('destination', contract_info)
-            dest_w3 = connect_to('destination')
-            dest_contract = dest_w3.eth.contract(
-                address=dest_contract_data['address'],
-                abi=dest_contract_data['abi']
-            )
-            
+                print(f"No {event_name} events found or error: {e}")
+                return 0
+
+            events = state.claim(chain, events)
+            statuses = relay_events(chain, events, warden_account, contract_info, state=state)
+            unsent = record_relays(chain, state, events, statuses)
+            state.release(chain, unsent)
+            if unsent and unsent_block is None:
+                unsent_block = min(e['blockNumber'] for e in unsent)
+            # Rescan from the first block with an unsent event next time
+            state.set_checkpoint(chain, contract_address, end if unsent_block is None else unsent_block - 1)
+    return 0 if unsent_block is not None else 1
+
+
+async def scan_blocks_async(chain, contract_info="contract_info.json", max_in_flight=MAX_IN_FLIGHT,
+                            state_db=STATE_DB):
+    """
+    Concurrent version of scan_blocks built on AsyncWeb3.
+
+    Events of the last 5 blocks are relayed concurrently: each relay
+    transaction is built, signed and sent as soon as one of the
+    max_in_flight slots is free, and its confirmation is awaited in the
+    background while further transactions go out. Nonces come from the
+    warden's local nonce manager (shared with relay_events).
+
+    Events go through the processed-event store in state_db like in
+    scan_blocks and follow: only events claimed by this run are relayed
+    and each relay transaction is recorded as soon as it is broadcast, so
+    no run relays an event twice. No checkpoint is kept.
+
+    Returns one dict per relayed event: {'event', 'tx_hash', 'status',
+    'error'}, where status is 'success', 'failed' (reverted), 'sent' (no
+    receipt seen) or 'error' (not sent)
+    """
+    if chain not in ['source','destination']:
+        print( f"Invalid chain: {chain}" )
+        return []
+
+    contract_data = get_contract_info(chain, contract_info)
+    target = 'destination' if chain == 'source' else 'source'
+    target_data = get_contract_info(target, contract_info)
+    if not contract_data or not target_data:
+        return []
+
+    import os
+    warden_private_key = os.getenv('PRIVATE_KEY')
+    if not warden_private_key:
+        print("Error: PRIVATE_KEY environment variable not set")
+        return []
+
+    from eth_account import Account
+    warden_account = Account.from_key(warden_private_key)
+    warden_address = warden_account.address
+
+    w3 = get_async_w3(chain)
+    target_w3 = get_async_w3(target)
+    # Transactions are built and signed offline, so the sync contract object will do
+    target_contract = get_contract(target, target_data['address'], target_data['abi'])
+    builder = get_tx_builder(target, warden_account)
+
+    latest_block = await w3.eth.block_number
+    from_block = max(0, latest_block - 4)
+    decoder = get_decoder(contract_info)
+    topic = decoder.topic('Deposit' if chain == 'source' else 'Unwrap')
+    logs, gas_price, chain_id = await asyncio.gather(
+        w3.eth.get_logs({'fromBlock': from_block, 'toBlock': latest_block,
+                         'address': contract_data['address'], 'topics': [topic]}),
+        target_w3.eth.gas_price,
+        target_w3.eth.chain_id,
+    )
+    events = decoder.decode_many(logs)
+
+    slots = asyncio.Semaphore(max_in_flight)
+    nonce_lock = asyncio.Lock()
+    nonces = get_nonce_manager(target, warden_address)
+
+    async def relay(evt):
+        name, args = relay_call(chain, evt)
+        result = {'event': evt, 'tx_hash': None, 'status': 'error', 'error': None}
+        async with slots:
             try:
-                nonce = dest_w3.eth.get_transaction_count(warden_address)
-                
-                wrap_txn = dest_contract.functions.wrap(
-                    token,
-                    recipient,
-                    amount
-                ).build_transaction({
-                    'from': warden_address,
-                    'nonce': nonce,
-                    'gas': 300000,
-                    'gasPrice': dest_w3.eth.gas_price
-                })
-                
-                signed_txn = warden_account.sign_transaction(wrap_txn)
-                tx_hash = dest_w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                tx_receipt = dest_w3.eth.wait_for_transaction_receipt(tx_hash)
-                
-                print(f"Wrap transaction successful: {tx_hash.hex()}")
-                
+                async with nonce_lock:
+                    if nonces.needs_sync:
+                        nonces.sync(await target_w3.eth.get_transaction_count(warden_address, 'pending'))
+                    nonce = nonces.allocate()
+                    try:
+                        tx = builder.build(target_contract.functions[name](*args), nonce,
+                                           RELAY_GAS, gas_price, chain_id)
+                        tx_hash = await target_w3.eth.send_raw_transaction(builder.sign(tx))
+                    except Exception as e:
+                        nonces.failed(nonce, e)
+                        raise
+                    nonces.sent(nonce, tx_hash, tx)
+                state.mark_sent(chain, [evt], tx_hash)
+                result['status'] = 'sent'
+                result['tx_hash'] = tx_hash.hex()
+                print(f"Sent {name}{args}: {result['tx_hash']}")
+                receipt = await target_w3.eth.wait_for_transaction_receipt(tx_hash)
+                nonces.confirmed(nonce)
+                result['status'] = 'success' if receipt['status'] == 1 else 'failed'
             except Exception as e:
-                print(f"Error calling wrap(): {e}")
-    
-    elif chain == 'destination':
-        # 使用相同的方法处理 Unwrap 事件
-        event_filter = contract.events.Unwrap.build_filter()
-        event_filter.fromBlock = from_block
-        event_filter.toBlock = to_block
-        
+                result['error'] = str(e)
+                print(f"Error calling {name}(): {e}")
+        return result
+
+    with BridgeState(state_db) as state:
+        settle_relays(chain, state)
+        events = state.claim(chain, events)
+        results = await asyncio.gather(*(relay(evt) for evt in events))
+        statuses = ['done' if result['status'] == 'success' else result['status'] for result in results]
+        state.release(chain, record_relays(chain, state, events, statuses))
+    for result in results:
+        if result['status'] == 'success':
+            print(f"{relay_call(chain, result['event'])[0]} transaction successful: {result['tx_hash']}")
+    return results
+
+
+def follow(chain, contract_info="contract_info.json", state_db=STATE_DB, poll_interval=POLL_INTERVAL, stop=None):
+    """
+    Long-running version of scan_blocks: tails new blocks (see follower)
+    and relays their Deposit (source) or Unwrap (destination) events as
+    soon as each block is seen, until stop() is true.
+
+    Starts after the stored checkpoint (at the current head on the first
+    run). Blocks rolled back by a reorg are reported; their events are
+    dropped from the retry list, and events that show up again in the new
+    chain are not relayed twice (processed-event store). Events whose relay
+    transaction could not be sent are retried with every new block; relay
+    transactions without a receipt are settled by looking their receipts
+    up (see settle_relays) and replaced if stuck (see
+    nonce_manager.replace_stuck)
+    """
+    if chain not in ['source','destination']:
+        print( f"Invalid chain: {chain}" )
+        return
+
+    contract_data = get_contract_info(chain, contract_info)
+    if not contract_data:
+        return
+    contract_address = contract_data['address']
+
+    w3 = connect_to(chain)
+    contract = get_contract(chain, contract_address, contract_data['abi'])
+    target = 'destination' if chain == 'source' else 'source'
+
+    import os
+    warden_private_key = os.getenv('PRIVATE_KEY')
+    if not warden_private_key:
+        print("Error: PRIVATE_KEY environment variable not set")
+        return
+
+    from eth_account import Account
+    warden_account = Account.from_key(warden_private_key)
+
+    decoder = get_decoder(contract_info)
+    event_name = 'Deposit' if chain == 'source' else 'Unwrap'
+    topic = decoder.topic(event_name)
+    retry = []
+
+    with BridgeState(state_db) as state:
+        checkpoint = state.get_checkpoint(chain, contract_address)
+        follower = BlockFollower(w3, {'address': contract_address, 'topics': [topic]},
+                                 start_block=None if checkpoint is None else checkpoint + 1)
+
+        def handle(kind, number, block_hash, logs):
+            events = decoder.decode_many(logs)
+            if kind == 'remove':
+                removed = {event_key(e) for e in events}
+                retry[:] = [e for e in retry if event_key(e) not in removed]
+                if events:
+                    print(f"Reorg on {chain}: block {number} rolled back with {len(events)} event(s)")
+                state.set_checkpoint(chain, contract_address, number - 1)
+                return
+
+            released = settle_relays(chain, state)
+            if released:
+                # Events of reverted batches, to be relayed again
+                events += fetch_events(w3, contract, event_name, min(released), max(released),
+                                       contract_info=contract_info)
+            state.touch(chain, retry)
+            events = retry + state.claim(chain, events)
+            if not events:
+                # relay_events does this itself before sending
+                replace_stuck_relays(target, warden_account, state)
+            statuses = relay_events(chain, events, warden_account, contract_info, state=state)
+            retry[:] = record_relays(chain, state, events, statuses)
+            if retry:
+                state.set_checkpoint(chain, contract_address, min(e['blockNumber'] for e in retry) - 1)
+            else:
+                state.set_checkpoint(chain, contract_address, number)
+
         try:
-            unwrap_events = event_filter.deploy(w3).get_all_entries()
-        except:
-            # 备用方法
-            try:
-                unwrap_events = w3.eth.get_logs({
-                    'fromBlock': from_block,
-                    'toBlock': to_block,
-                    'address': contract_address,
-                    'topics': [w3.keccak(text="Unwrap(address,address,address,address,uint256)").hex()]
-                })
-                unwrap_events = [contract.events.Unwrap().process_log(log) for log in unwrap_events]
-            except Exception as e:
-                print(f"No Unwrap events found or error: {e}")
-                unwrap_events = []
-        
-        for event in unwrap_events:
-            underlying_token = event['args']['underlying_token']
-            recipient = event['args']['to']
-            amount = event['args']['amount']
-            
-            print(f"Found Unwrap event: token={underlying_token}, recipient={recipient}, amount={amount}")
-            
-            source_contract_data = get_contract_info('source', contract_info)
-            source_w3 = connect_to('source')
-            source_contract = source_w3.eth.contract(
-                address=source_contract_data['address'],
-                abi=source_contract_data['abi']
-            )
-            
-            try:
-                nonce = source_w3.eth.get_transaction_count(warden_address)
-                
-                withdraw_txn = source_contract.functions.withdraw(
-                    underlying_token,
-                    recipient,
-                    amount
-                ).build_transaction({
-                    'from': warden_address,
-                    'nonce': nonce,
-                    'gas': 300000,
-                    'gasPrice': source_w3.eth.gas_price
-                })
-                
-                signed_txn = warden_account.sign_transaction(withdraw_txn)
-                tx_hash = source_w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                tx_receipt = source_w3.eth.wait_for_transaction_receipt(tx_hash)
-                
-                print(f"Withdraw transaction successful: {tx_hash.hex()}")
-                
-            except Exception as e:
-                print(f"Error calling withdraw(): {e}")
+            follower.follow(handle, poll_interval, stop)
+        finally:
+            state.release(chain, retry)
@@ -0,0 +1,244 @@
+"""
+Persistent scan state for the bridge (SQLite)
+
+    checkpoints - last block of each (chain, contract) whose events have
+                  all been settled
+    replaced    - relay transactions replaced by another with the same
+                  nonce (see nonce_manager.replace_stuck); either one may
+                  be the one mined
+    processed   - every event (chain, tx hash, log index) that is being
+                  relayed or has been, with its status:
+
+        claimed - a run is about to relay it
+        sent    - its relay transaction (relay_tx) was broadcast, receipt
+                  not seen yet
+        done    - relayed
+        failed  - its relay transaction was mined and reverted; not retried
+
+Runs claim events before relaying them (INSERT OR IGNORE on the primary
+key), so two overlapping runs never relay the same event, and a repeated
+run over the same blocks relays nothing. A row with a relay_tx is never
+released or expired: it is settled by looking up that transaction's
+receipt (see settle).
+"""
+import sqlite3
+import time
+
+# Claims older than this (seconds) with no relay transaction sent belong to
+# a run that died and are taken over
+CLAIM_TIMEOUT = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    chain TEXT NOT NULL,
+    contract TEXT NOT NULL,
+    last_block INTEGER NOT NULL,
+    PRIMARY KEY (chain, contract)
+);
+CREATE TABLE IF NOT EXISTS processed (
+    chain TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL,
+    block_number INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    relay_tx TEXT,
+    PRIMARY KEY (chain, tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS processed_relay_tx ON processed (relay_tx);
+CREATE TABLE IF NOT EXISTS replaced (
+    relay_tx TEXT PRIMARY KEY,
+    replaced_by TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replaced_by ON replaced (replaced_by);
+"""
+
+
+def event_key(event):
+    """
+    (tx hash hex, log index) identifying a decoded event or raw log
+    """
+    tx_hash = event['transactionHash']
+    if not isinstance(tx_hash, str):
+        tx_hash = tx_hash.hex()
+    return tx_hash.lower().removeprefix('0x'), int(event['logIndex'])
+
+
+def tx_hex(tx_hash):
+    """
+    0x-prefixed lowercase hex of a transaction hash (str or bytes)
+    """
+    if not isinstance(tx_hash, str):
+        tx_hash = bytes(tx_hash).hex()
+    return '0x' + tx_hash.lower().removeprefix('0x')
+
+
+class BridgeState:
+
+    def __init__(self, path="bridge_state.db"):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(processed)")]
+        if columns and 'relay_tx' not in columns:
+            # Store created before relay transactions were recorded
+            self.db.execute("ALTER TABLE processed ADD COLUMN relay_tx TEXT")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_checkpoint(self, chain, contract):
+        row = self.db.execute("SELECT last_block FROM checkpoints WHERE chain = ? AND contract = ?",
+                              (chain, contract)).fetchone()
+        return None if row is None else row[0]
+
+    def set_checkpoint(self, chain, contract, block):
+        self.db.execute("INSERT INTO checkpoints (chain, contract, last_block) VALUES (?, ?, ?) "
+                        "ON CONFLICT (chain, contract) DO UPDATE SET last_block = excluded.last_block",
+                        (chain, contract, block))
+
+    def claim(self, chain, events):
+        """
+        Returns the events no other run has relayed or is relaying, and
+        records them as claimed by this run
+        """
+        now = time.time()
+        claimed = []
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute("DELETE FROM processed WHERE chain = ? AND status = 'claimed' "
+                            "AND relay_tx IS NULL AND updated < ?",
+                            (chain, now - CLAIM_TIMEOUT))
+            for event in events:
+                tx_hash, log_index = event_key(event)
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO processed (chain, tx_hash, log_index, block_number, status, updated) "
+                    "VALUES (?, ?, ?, ?, 'claimed', ?)",
+                    (chain, tx_hash, log_index, int(event['blockNumber']), now))
+                if cur.rowcount:
+                    claimed.append(event)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def touch(self, chain, events):
+        """
+        Renews this run's claim on events it keeps retrying, so it does not expire (CLAIM_TIMEOUT)
+        """
+        now = time.time()
+        self.db.executemany("UPDATE processed SET updated = ? "
+                            "WHERE chain = ? AND tx_hash = ? AND log_index = ? AND status = 'claimed'",
+                            [(now, chain) + event_key(event) for event in events])
+
+    def _set_status(self, chain, events, status):
+        now = time.time()
+        self.db.executemany("UPDATE processed SET status = ?, updated = ? "
+                            "WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+                            [(status, now, chain) + event_key(event) for event in events])
+
+    def mark_done(self, chain, events):
+        self._set_status(chain, events, 'done')
+
+    def mark_failed(self, chain, events):
+        """
+        Records that the relay transaction of events reverted on chain, so they are not sent again
+        """
+        self._set_status(chain, events, 'failed')
+
+    def mark_sent(self, chain, events, relay_tx):
+        """
+        Records the relay transaction broadcast for events; call it before waiting for the receipt
+        """
+        now = time.time()
+        self.db.executemany("UPDATE processed SET status = 'sent', relay_tx = ?, updated = ? "
+                            "WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+                            [(tx_hex(relay_tx), now, chain) + event_key(event) for event in events])
+
+    def unsend(self, chain, events):
+        """
+        Back to claimed for events whose relay transaction was mined and
+        reverted and which are about to be relayed again another way
+        """
+        self.db.executemany("UPDATE processed SET status = 'claimed', relay_tx = NULL "
+                            "WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+                            [(chain,) + event_key(event) for event in events])
+
+    def replace_tx(self, old_tx, new_tx):
+        """
+        Points the events relayed by old_tx at new_tx, which replaced it
+        (same nonce), and remembers old_tx in case it is mined after all
+        """
+        old_tx, new_tx = tx_hex(old_tx), tx_hex(new_tx)
+        cur = self.db.execute("UPDATE processed SET relay_tx = ? WHERE relay_tx = ?", (new_tx, old_tx))
+        if cur.rowcount:
+            self.db.execute("INSERT OR REPLACE INTO replaced (relay_tx, replaced_by) VALUES (?, ?)",
+                            (old_tx, new_tx))
+
+    def relay_txs(self, relay_tx):
+        """
+        relay_tx and every transaction it replaced, newest first: whichever
+        of them is mined settles the events of relay_tx
+        """
+        txs = [tx_hex(relay_tx)]
+        while True:
+            row = self.db.execute("SELECT relay_tx FROM replaced WHERE replaced_by = ?", (txs[-1],)).fetchone()
+            if row is None or row[0] in txs:
+                return txs
+            txs.append(row[0])
+
+    def status(self, chain, event):
+        row = self.db.execute("SELECT status FROM processed WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+                              (chain,) + event_key(event)).fetchone()
+        return None if row is None else row[0]
+
+    def unconfirmed(self, chain):
+        """
+        Relay transactions of chain's events that were sent but whose receipt has not been seen
+        """
+        return [row[0] for row in self.db.execute(
+            "SELECT DISTINCT relay_tx FROM processed WHERE chain = ? AND status = 'sent'", (chain,))]
+
+    def settle(self, chain, relay_tx, succeeded):
+        """
+        Applies the receipt of relay_tx to its events: done if it
+        succeeded, failed if it reverted. A reverted batch transaction
+        releases its events instead, so they are relayed again (the batch
+        may have reverted because of a single entry).
+
+        Returns the block numbers of the released events (empty unless a
+        batch was released); the caller rescans them
+        """
+        relay_tx = tx_hex(relay_tx)
+        self.db.executemany("DELETE FROM replaced WHERE replaced_by = ?",
+                            [(tx,) for tx in self.relay_txs(relay_tx)])
+        blocks = [row[0] for row in self.db.execute(
+            "SELECT block_number FROM processed WHERE chain = ? AND relay_tx = ? AND status = 'sent'",
+            (chain, relay_tx))]
+        if not succeeded and len(blocks) > 1:
+            self.db.execute("DELETE FROM processed WHERE chain = ? AND relay_tx = ? AND status = 'sent'",
+                            (chain, relay_tx))
+            return blocks
+        self.db.execute("UPDATE processed SET status = ?, updated = ? "
+                        "WHERE chain = ? AND relay_tx = ? AND status = 'sent'",
+                        ('done' if succeeded else 'failed', time.time(), chain, relay_tx))
+        return []
+
+    def release(self, chain, events):
+        """
+        Gives up the claim on events whose relay transaction was never
+        sent, so a later run retries them. Events with a relay transaction
+        are left alone
+        """
+        self.db.executemany("DELETE FROM processed WHERE chain = ? AND tx_hash = ? AND log_index = ? "
+                            "AND status = 'claimed' AND relay_tx IS NULL",
+                            [(chain,) + event_key(event) for event in events])
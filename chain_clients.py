@@ -0,0 +1,166 @@
+"""
+Process-wide registry of chain clients
+
+Every module that talks to a chain gets its Web3 instance from here, so
+each chain has exactly one client with one keep-alive HTTP session (and
+the POA middleware injected once). Contract objects, parsed contract_info
+files and static values such as the chain id are cached as well.
+
+Chains can be named either way the assignments do: 'avax' / 'source'
+(Avalanche Fuji C-chain) and 'bsc' / 'destination' (BSC testnet).
+"""
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncWeb3, Web3
+from web3.middleware import ExtraDataToPOAMiddleware  # Necessary for POA chains
+
+from rpc_cache import FINALITY_DEPTH, RPC_CACHE, RpcCache, cache_middleware
+
+CHAIN_URLS = {
+    'avax': "https://api.avax-test.network/ext/bc/C/rpc",  # AVAX C-chain testnet
+    'bsc': "https://data-seed-prebsc-1-s1.binance.org:8545/",  # BSC testnet
+}
+CHAIN_ALIASES = {
+    'source': 'avax',
+    'destination': 'bsc',
+}
+# Connections kept open per chain (enough for the parallel log fetchers)
+POOL_SIZE = 16
+# Responses the providers keep in memory: the chain id, which web3 otherwise
+# re-fetches to validate every eth_call / eth_estimateGas
+CACHEABLE_REQUESTS = {'eth_chainId'}
+# On-disk cache of final eth_getLogs / receipt responses (None disables it), see rpc_cache
+RPC_CACHE_PATH = RPC_CACHE
+
+_lock = threading.RLock()
+_clients = {}
+_async_clients = {}
+_contracts = {}
+_contract_info = {}
+_chain_ids = {}
+_rpc_cache = None
+
+
+def canonical_chain(chain):
+    """
+    Maps 'source' / 'destination' to 'avax' / 'bsc'; raises ValueError for unknown chains
+    """
+    chain = CHAIN_ALIASES.get(chain, chain)
+    if chain not in CHAIN_URLS:
+        raise ValueError(f"{chain} is not a valid chain")
+    return chain
+
+
+def _session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_rpc_cache():
+    """
+    The RpcCache shared by all chain clients, or None if caching is disabled
+    """
+    global _rpc_cache
+    if RPC_CACHE_PATH is None:
+        return None
+    with _lock:
+        if _rpc_cache is None:
+            _rpc_cache = RpcCache(RPC_CACHE_PATH)
+    return _rpc_cache
+
+
+def get_w3(chain):
+    """
+    Returns the shared Web3 instance for chain
+    """
+    chain = canonical_chain(chain)
+    w3 = _clients.get(chain)
+    if w3 is not None:
+        return w3
+    with _lock:
+        w3 = _clients.get(chain)
+        if w3 is None:
+            w3 = Web3(Web3.HTTPProvider(CHAIN_URLS[chain], session=_session(), cache_allowed_requests=True,
+                                        cacheable_requests=CACHEABLE_REQUESTS))
+            # inject the poa compatibility middleware to the innermost layer
+            w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+            cache = get_rpc_cache()
+            if cache is not None:
+                # Innermost, so it wraps the provider directly and caches raw responses
+                w3.middleware_onion.inject(cache_middleware(chain, cache, FINALITY_DEPTH), name='rpc_cache', layer=0)
+            _clients[chain] = w3
+    return w3
+
+
+def get_async_w3(chain):
+    """
+    Returns the shared AsyncWeb3 instance for chain (its provider keeps
+    one aiohttp session per event loop)
+    """
+    chain = canonical_chain(chain)
+    w3 = _async_clients.get(chain)
+    if w3 is None:
+        with _lock:
+            w3 = _async_clients.get(chain)
+            if w3 is None:
+                w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(CHAIN_URLS[chain], cache_allowed_requests=True,
+                                                            cacheable_requests=CACHEABLE_REQUESTS))
+                w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+                _async_clients[chain] = w3
+    return w3
+
+
+def get_chain_id(chain):
+    """
+    Chain id of chain, fetched once per process
+    """
+    chain = canonical_chain(chain)
+    chain_id = _chain_ids.get(chain)
+    if chain_id is None:
+        chain_id = _chain_ids[chain] = get_w3(chain).eth.chain_id
+    return chain_id
+
+
+def load_contract_info(path="contract_info.json"):
+    """
+    Parsed contents of a contract_info file, re-read only when it changes on disk
+    """
+    key = os.path.abspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    cached = _contract_info.get(key)
+    if cached is None or cached[0] != mtime:
+        with open(key, 'r') as f:
+            cached = _contract_info[key] = (mtime, json.load(f))
+    return cached[1]
+
+
+def get_contract(chain, address, abi, asynchronous=False):
+    """
+    Returns the shared contract object for (chain, address, abi), bound to
+    the AsyncWeb3 client of the chain if asynchronous is set
+    """
+    chain = canonical_chain(chain)
+    key = (chain, address, json.dumps(abi, sort_keys=True), asynchronous)
+    contract = _contracts.get(key)
+    if contract is None:
+        with _lock:
+            contract = _contracts.get(key)
+            if contract is None:
+                w3 = get_async_w3(chain) if asynchronous else get_w3(chain)
+                contract = _contracts[key] = w3.eth.contract(address=address, abi=abi)
+    return contract
+
+
+def get_info_contract(chain, contract_info="contract_info.json", asynchronous=False):
+    """
+    Returns the contract listed under chain (e.g. 'source') in a contract_info file
+    """
+    d = load_contract_info(contract_info)[chain]
+    return get_contract(chain, d['address'], d['abi'], asynchronous=asynchronous)
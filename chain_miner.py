@@ -0,0 +1,177 @@
+#!/bin/python
+"""
+Mining and verifying chains of blocks on top of findBlockNonce.mine_block
+
+A block is (prev_hash, transactions, nonce) and its hash is
+sha256(prev_hash + transactions + nonce), exactly what mine_block
+searches over. The hash of each block is the prev_hash of the next one.
+
+Blocks are streamed as JSON lines:
+    {"height": 0, "prev_hash": "<hex>", "transactions": [...], "nonce": "<hex>", "hash": "<hex>"}
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from findBlockNonce import mine_block
+from tx_sampler import get_sampler
+
+GENESIS_PREV_HASH = hashlib.sha256(b"previous block").digest()
+
+
+def block_hash(prev_hash, transactions, nonce):
+    """
+    Hash of a block, computed the same way as the validator
+    """
+    h = hashlib.sha256()
+    h.update(prev_hash)
+    for line in transactions:
+        h.update(line.encode('utf-8'))
+    h.update(nonce)
+    return h.digest()
+
+
+def check_block(k, prev_hash, transactions, nonce):
+    """
+    Returns True if the hash of the block has k trailing zero bits
+    """
+    if k == 0:
+        return True
+    return meets_difficulty(k, block_hash(prev_hash, transactions, nonce))
+
+
+def meets_difficulty(k, digest):
+    """
+    Returns True if digest has k trailing zero bits
+    """
+    return not int.from_bytes(digest[-((k + 7) // 8):], 'big') & ((1 << k) - 1)
+
+
+def _block_hash_args(args):
+    return block_hash(*args)
+
+
+def mine_chain(k, length, filename="bitcoin_text.txt", num_lines=10,
+               prev_hash=GENESIS_PREV_HASH, workers=1, out=None):
+    """
+        k - difficulty of every block (trailing zero bits)
+        length - number of blocks to mine
+        filename - file the transactions are sampled from
+        num_lines - transactions per block
+        prev_hash - prev_hash of the first block
+        workers - passed on to mine_block
+        out - optional path or writable text file; every block is appended
+            to it as a JSON line as soon as it has been mined
+
+        Generator yielding the blocks (dicts) in order. The transactions of
+        the next block are sampled on a background thread while the
+        current block is being mined, so the miner never waits for a template
+    """
+    sampler = get_sampler(filename)
+    stream = open(out, 'a') if isinstance(out, (str, os.PathLike)) else out
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as templates:
+            next_template = templates.submit(sampler.sample, num_lines)
+            for height in range(length):
+                transactions = next_template.result()
+                if height + 1 < length:
+                    next_template = templates.submit(sampler.sample, num_lines)
+
+                nonce = mine_block(k, prev_hash, transactions, workers=workers)
+                digest = block_hash(prev_hash, transactions, nonce)
+                block = {
+                    'height': height,
+                    'prev_hash': prev_hash,
+                    'transactions': transactions,
+                    'nonce': nonce,
+                    'hash': digest,
+                }
+                if stream is not None:
+                    stream.write(json.dumps(_encode_block(block)) + '\n')
+                    stream.flush()
+                yield block
+                prev_hash = digest
+    finally:
+        if stream is not None and stream is not out:
+            stream.close()
+
+
+def _encode_block(block):
+    return {key: value.hex() if isinstance(value, bytes) else value for key, value in block.items()}
+
+
+def read_chain(path):
+    """
+    Generator over the blocks of a JSON lines file written by mine_chain
+    """
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            block = json.loads(line)
+            for key in ('prev_hash', 'nonce', 'hash'):
+                block[key] = bytes.fromhex(block[key])
+            yield block
+
+
+def hash_blocks(blocks, workers=None, chunksize=256):
+    """
+        blocks - iterable of (prev_hash, transactions, nonce) triples
+
+        Returns the hash of every block. Blocks are hashed in chunks of
+        chunksize across a pool of worker processes (default: one per
+        CPU), which keeps the IPC cost per block small; with a single
+        worker or fewer blocks than chunksize they are hashed in this
+        process
+    """
+    jobs = list(blocks)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(jobs) < chunksize:
+        return [block_hash(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_block_hash_args, jobs, chunksize=chunksize))
+
+
+def verify_blocks(k, blocks, workers=None, chunksize=256):
+    """
+        k - difficulty every block must meet
+        blocks - iterable of (prev_hash, transactions, nonce) triples
+
+        Returns a list of booleans, one per block, saying whether its hash
+        has k trailing zero bits (hashed by hash_blocks)
+    """
+    return [meets_difficulty(k, digest) for digest in hash_blocks(blocks, workers, chunksize)]
+
+
+def verify_chain(k, blocks, workers=None, chunksize=256):
+    """
+        k - difficulty every block must meet
+        blocks - list of block dicts (as yielded by mine_chain / read_chain)
+
+        Returns the index of the first invalid block, or None if the whole
+        chain is valid. A block is invalid if its nonce does not meet the
+        difficulty or its prev_hash is not the hash of the block before it
+    """
+    blocks = list(blocks)
+    digests = hash_blocks(((b['prev_hash'], b['transactions'], b['nonce']) for b in blocks),
+                          workers=workers, chunksize=chunksize)
+    prev = None
+    for i, (block, digest) in enumerate(zip(blocks, digests)):
+        if not meets_difficulty(k, digest):
+            return i
+        if prev is not None and block['prev_hash'] != prev:
+            return i
+        prev = digest
+    return None
+
+
+if __name__ == '__main__':
+    chain_file = "chain.jsonl"
+    diff = 12
+    for block in mine_chain(diff, 5, out=chain_file):
+        print(f"Block {block['height']}: nonce {block['nonce'].hex()} hash {block['hash'].hex()}")
+    bad = verify_chain(diff, read_chain(chain_file))
+    print("Chain is valid" if bad is None else f"Block {bad} is invalid")
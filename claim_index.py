@@ -0,0 +1,148 @@
+"""
+Local index of which Merkle leaves have already been claimed
+
+The index is built from the claim contract's events and kept current by
+scanning only the blocks added since the last sync; it is persisted to a
+JSON file between runs. Picking an unclaimed leaf is then an O(1) local
+lookup instead of a guess followed by a transaction.
+
+Works with any web3 instance, e.g. Web3(EthereumTesterProvider()) for a
+local stand-in chain.
+"""
+import json
+import os
+import random
+
+# Blocks requested per eth_getLogs call while catching up
+CLAIM_SCAN_CHUNK = 5000
+# Argument types that can carry a claimed leaf
+LEAF_ARG_TYPES = ('bytes32', 'uint256')
+
+
+def claim_event_arg(abi, event_name, leaf_arg):
+    """
+    Checks that the ABI has event event_name with a bytes32 / uint256
+    argument leaf_arg; raises ValueError if not
+    """
+    for item in abi:
+        if item.get('type') != 'event' or item.get('name') != event_name:
+            continue
+        for arg in item['inputs']:
+            if arg['name'] == leaf_arg:
+                if arg['type'] not in LEAF_ARG_TYPES:
+                    raise ValueError(f"{event_name}.{leaf_arg} is {arg['type']}, not bytes32/uint256")
+                return
+        raise ValueError(f"event {event_name} has no argument {leaf_arg}")
+    raise ValueError(f"contract ABI has no event {event_name}")
+
+
+class ClaimIndex:
+    """
+    Which of "leaves" (32-byte values, in tree order) have been claimed.
+
+    index = ClaimIndex(w3, contract, leaves, 'Claimed', 'leaf', start_block=deploy_block,
+                       path="claim_index.json")
+    index.sync()
+    i = index.pick()            # random unclaimed leaf index, or None
+    index.mark_claimed(i)
+    index.save()
+    """
+
+    def __init__(self, w3, contract, leaves, event_name, leaf_arg, start_block, path=None):
+        """
+            event_name, leaf_arg - the contract's claim event and its argument holding the claimed leaf
+            start_block - first block scanned for claim events (the contract's deployment
+                          block) unless a saved index at path is resumed
+        """
+        self.w3 = w3
+        self.contract = contract
+        self.path = path
+        claim_event_arg(contract.abi, event_name, leaf_arg)
+        self.event_name = event_name
+        self.leaf_arg = leaf_arg
+        self._leaf_index = {bytes(leaf): i for i, leaf in enumerate(leaves)}
+        self.last_block = start_block - 1
+
+        # Unclaimed indices in a list plus each one's position in it, so
+        # that both removing and random picking are O(1)
+        self._unclaimed = list(range(len(self._leaf_index)))
+        self._position = {i: i for i in self._unclaimed}
+        self.claimed = set()
+
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            state = json.load(f)
+        if state.get('address') != self.contract.address or state.get('leaves') != len(self._leaf_index):
+            # Index of a different contract or leaf set, start over
+            return
+        # Resume where the saved index stopped, even before start_block:
+        # skipping blocks would miss claims
+        self.last_block = state['last_block']
+        for i in state['claimed']:
+            self.mark_claimed(i)
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({
+                'address': self.contract.address,
+                'leaves': len(self._leaf_index),
+                'last_block': self.last_block,
+                'claimed': sorted(self.claimed),
+            }, f)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._unclaimed)
+
+    def is_claimed(self, index):
+        return index in self.claimed
+
+    def mark_claimed(self, index):
+        pos = self._position.pop(index, None)
+        if pos is None:
+            return
+        last = self._unclaimed.pop()
+        if last != index:
+            self._unclaimed[pos] = last
+            self._position[last] = pos
+        self.claimed.add(index)
+
+    def pick(self, rng=random):
+        """
+        Returns a random unclaimed leaf index, or None if every leaf is claimed
+        """
+        if not self._unclaimed:
+            return None
+        return self._unclaimed[rng.randrange(len(self._unclaimed))]
+
+    def _leaf_of(self, value):
+        if isinstance(value, int):
+            return value.to_bytes(32, 'big')
+        return bytes(value)
+
+    def sync(self, to_block='latest', chunk=CLAIM_SCAN_CHUNK):
+        """
+        Applies the claim events of blocks last_block+1 .. to_block and
+        saves the index. Returns the number of newly claimed leaves
+        """
+        if to_block == 'latest':
+            to_block = self.w3.eth.block_number
+        event = self.contract.events[self.event_name]
+        before = len(self.claimed)
+        start = self.last_block + 1
+        while start <= to_block:
+            end = min(start + chunk - 1, to_block)
+            for log in event.get_logs(from_block=start, to_block=end):
+                index = self._leaf_index.get(self._leaf_of(log['args'][self.leaf_arg]))
+                if index is not None:
+                    self.mark_claimed(index)
+            self.last_block = end
+            start = end + 1
+        self.save()
+        return len(self.claimed) - before
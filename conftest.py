@@ -0,0 +1,19 @@
+"""
+Fixtures shared by the tests that run against a local eth-tester chain
+"""
+import pytest
+
+
+@pytest.fixture
+def deploy_runtime():
+    """
+    deploy_runtime(w3, runtime) deploys hand-assembled runtime bytecode
+    from w3.eth.default_account; returns (contract address, deploy block)
+    """
+    def deploy(w3, runtime):
+        # codecopy the runtime (which starts at byte 11) to memory and return it
+        init = bytes.fromhex(f"60{len(runtime):02x}80600b6000396000f3") + runtime
+        tx = w3.eth.send_transaction({'data': init, 'gas': 200000})
+        receipt = w3.eth.wait_for_transaction_receipt(tx)
+        return receipt['contractAddress'], receipt['blockNumber']
+    return deploy
@@ -0,0 +1,149 @@
+"""
+Buffered sinks for decoded event records
+
+Records are buffered in memory and written in batches of flush_rows:
+
+    CsvSink     - one append-only CSV file. A batch is rendered up front
+                  and written with a single write + fsync; a row left
+                  half-written by a crash is cut off when the file is
+                  reopened, so the file always ends on a complete row.
+    ParquetSink - a directory of Parquet part files (needs pyarrow). Each
+                  batch is written to a temporary file and renamed into
+                  place, so readers only ever see complete parts.
+
+Both take columns, an ordered {name: type} dict where type is 'int64',
+'bool' or 'string' (string columns hold anything str() can render, e.g. uint256
+amounts that do not fit in 64 bits).
+"""
+import csv
+import io
+import os
+
+# Records buffered before a batch is written
+FLUSH_ROWS = 10000
+
+
+class _BufferedSink:
+
+    def __init__(self, columns, flush_rows=FLUSH_ROWS):
+        self.columns = dict(columns)
+        self.flush_rows = flush_rows
+        self._buffer = []
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self._buffer:
+            self._write_batch(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(_BufferedSink):
+
+    def __init__(self, path, columns, flush_rows=FLUSH_ROWS):
+        super().__init__(columns, flush_rows)
+        self.path = path
+        # Opened on the first flush, so a scan without events leaves no file behind
+        self._fd = None
+
+    def _open(self):
+        """
+        Opens the file for appending, cutting off a trailing partial row
+        """
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = end = os.fstat(self._fd).st_size
+        if size and os.pread(self._fd, 1, size - 1) != b'\n':
+            while end > 0:
+                start = max(0, end - (1 << 16))
+                i = os.pread(self._fd, end - start, start).rfind(b'\n')
+                if i >= 0:
+                    end = start + i + 1
+                    break
+                end = start
+            os.ftruncate(self._fd, end)
+            os.fsync(self._fd)
+        self._needs_header = end == 0
+
+    def _write_batch(self, records):
+        if self._fd is None:
+            self._open()
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        if self._needs_header:
+            writer.writerow(self.columns)
+        writer.writerows([record[name] for name in self.columns] for record in records)
+        data = out.getvalue().encode()
+        written = 0
+        while written < len(data):
+            written += os.write(self._fd, data[written:])
+        os.fsync(self._fd)
+        self._needs_header = False
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class ParquetSink(_BufferedSink):
+
+    def __init__(self, directory, columns, flush_rows=FLUSH_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("ParquetSink needs pyarrow (pip install pyarrow)")
+        super().__init__(columns, flush_rows)
+        self._pa, self._pq = pa, pq
+        self.directory = directory
+        self.schema = pa.schema([(name, pa.type_for_alias(t)) for name, t in self.columns.items()])
+        os.makedirs(directory, exist_ok=True)
+        parts = [int(f[5:-8]) for f in os.listdir(directory)
+                 if f.startswith('part-') and f.endswith('.parquet') and f[5:-8].isdigit()]
+        self._next_part = max(parts, default=-1) + 1
+
+    def _write_batch(self, records):
+        arrays = []
+        for name, t in self.columns.items():
+            values = [record[name] for record in records]
+            if t == 'string':
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(values)
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(values, type=field.type) for values, field in zip(arrays, self.schema)],
+            schema=self.schema)
+        path = os.path.join(self.directory, f"part-{self._next_part:06d}.parquet")
+        tmp = path + ".tmp"
+        self._pq.write_table(table, tmp)
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._next_part += 1
+
+
+def open_sink(path, columns, flush_rows=FLUSH_ROWS):
+    """
+    ParquetSink if path ends in .parquet (a directory of parts), CsvSink otherwise
+    """
+    if path.endswith('.parquet'):
+        return ParquetSink(path, columns, flush_rows)
+    return CsvSink(path, columns, flush_rows)
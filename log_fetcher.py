@@ -0,0 +1,130 @@
+"""
+Adaptive, parallel eth_getLogs over large block ranges
+
+The range is cut into windows that are fetched by a small pool of
+threads. When a node rejects a window as too large (too many blocks or
+too many results) the window is split in half and both halves are
+retried; the window size for new requests shrinks with it and grows
+again (doubling up to max_window) after successful requests. Rate-limit
+errors (HTTP 429 and the like) only back off and retry the same window.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocks per request to start with, and the largest window ever requested
+INITIAL_WINDOW = 2000
+MAX_WINDOW = 10000
+# Parallel requests
+FETCH_WORKERS = 4
+# Retries (with exponential backoff) of a window that failed for another
+# reason, and of a window the provider throttled
+MAX_RETRIES = 3
+MAX_RATE_LIMIT_RETRIES = 6
+RETRY_DELAY = 0.5
+# Substrings of the errors nodes return for oversized eth_getLogs requests
+RANGE_ERRORS = ('block range', 'range is too', 'range limit', 'is limited to', 'too many results',
+                'too many logs', 'too many blocks', 'too large', 'query returned more than',
+                'response size', 'query timeout')
+# Substrings of rate-limit errors (checked first: they must never split a window)
+RATE_LIMIT_ERRORS = ('too many requests', 'rate limit', 'request limit', 'rate exceeded', 'throttl')
+
+
+def is_rate_limited(error):
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RATE_LIMIT_ERRORS)
+
+
+def is_range_error(error):
+    message = str(error).lower()
+    return any(text in message for text in RANGE_ERRORS)
+
+
+def fetch_logs(w3, params, start_block, end_block, window=INITIAL_WINDOW,
+               max_window=MAX_WINDOW, workers=FETCH_WORKERS):
+    """
+        w3 - Web3 instance
+        params - the rest of the eth_getLogs filter, e.g. {'address': ..., 'topics': [...]}
+        start_block, end_block - inclusive block range
+
+        Returns all matching logs in (blockNumber, logIndex) order
+    """
+    if end_block < start_block:
+        return []
+
+    cond = threading.Condition()
+    state = {
+        'cursor': start_block,
+        'window': max(1, min(window, max_window)),
+        'in_flight': 0,
+        'error': None,
+    }
+    retry = []
+    logs = []
+
+    def next_range():
+        with cond:
+            while True:
+                if state['error'] is not None:
+                    return None
+                if retry:
+                    rng = retry.pop()
+                    break
+                if state['cursor'] <= end_block:
+                    lo = state['cursor']
+                    hi = min(lo + state['window'] - 1, end_block)
+                    state['cursor'] = hi + 1
+                    rng = (lo, hi, 0)
+                    break
+                if state['in_flight'] == 0:
+                    return None
+                cond.wait()
+            state['in_flight'] += 1
+            return rng
+
+    def worker():
+        while True:
+            rng = next_range()
+            if rng is None:
+                return
+            lo, hi, attempt = rng
+            if attempt:
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+            result = error = None
+            try:
+                result = w3.eth.get_logs(dict(params, fromBlock=lo, toBlock=hi))
+            except Exception as e:
+                error = e
+
+            with cond:
+                state['in_flight'] -= 1
+                if error is None:
+                    logs.extend(result)
+                    state['window'] = min(max_window, state['window'] * 2)
+                elif is_rate_limited(error):
+                    if attempt < MAX_RATE_LIMIT_RETRIES:
+                        retry.append((lo, hi, attempt + 1))
+                    else:
+                        state['error'] = error
+                elif is_range_error(error) and hi > lo:
+                    mid = (lo + hi) // 2
+                    retry.append((mid + 1, hi, 0))
+                    retry.append((lo, mid, 0))
+                    state['window'] = max(1, min(state['window'], hi - lo + 1) // 2)
+                elif attempt < MAX_RETRIES:
+                    retry.append((lo, hi, attempt + 1))
+                else:
+                    state['error'] = error
+                cond.notify_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for f in [pool.submit(worker) for _ in range(workers)]:
+            f.result()
+    if state['error'] is not None:
+        raise state['error']
+
+    logs.sort(key=lambda log: (int(log['blockNumber']), int(log['logIndex'])))
+    return logs
@@ -0,0 +1,475 @@
+"""
+Compact Merkle tree with the same layout as submitProof.build_merkle
+
+Each level is stored as one contiguous buffer of 32-byte nodes instead of
+a list of bytes objects, and a whole tree can be saved to disk and
+memory-mapped back. Like build_merkle, pairs are hashed in sorted order
+and an odd node at the end of a level is promoted unchanged.
+
+Indexing a FlatMerkleTree gives levels and indexing a level gives nodes,
+so it can be passed to prove_merkle in place of the list of lists:
+    tree = FlatMerkleTree.from_leaves(leaves)
+    tree[0][5]      # leaf 5 (bytes)
+    tree.root       # == build_merkle(leaves)[-1][0]
+
+IncrementalMerkleTree keeps its levels in bytearrays so leaves can be
+appended or replaced by rehashing only their path to the root.
+
+prove_many, prove_multi and the verify_* helpers produce and check proofs
+for many leaves at once (prove_multi in OpenZeppelin's multiproof format).
+"""
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_hash.auto import keccak
+
+NODE_SIZE = 32
+TREE_MAGIC = b'MRKL'
+TREE_VERSION = 1
+# magic, version, number of levels; followed by one uint64 node count per level
+TREE_HEADER = struct.Struct('<4sII')
+LEVEL_COUNT = struct.Struct('<Q')
+# Levels with fewer pairs than this are always hashed in-process
+PARALLEL_MIN_PAIRS = 1 << 15
+# Pairs per task when a level is spread across worker processes
+PARALLEL_CHUNK_PAIRS = 1 << 13
+
+
+def hash_pair(a, b):
+    """
+    keccak256 of the two 32-byte nodes concatenated in sorted order, i.e.
+    OpenZeppelin's commutative pair hash (MerkleProof._hashPair) and the
+    same value as Web3.solidity_keccak(['bytes32', 'bytes32'], sorted([a, b])),
+    without going through the ABI encoder
+    """
+    a = bytes(a)
+    b = bytes(b)
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+def _hash_pairs(buf):
+    """
+    Hashes consecutive pairs of nodes of buf (an even number of nodes)
+    and returns the parents as one buffer
+    """
+    out = []
+    append = out.append
+    for off in range(0, len(buf), 2 * NODE_SIZE):
+        a = buf[off:off + NODE_SIZE]
+        b = buf[off + NODE_SIZE:off + 2 * NODE_SIZE]
+        append(keccak(a + b) if a < b else keccak(b + a))
+    return b''.join(out)
+
+
+def hash_level(level, executor=None):
+    """
+    Returns the buffer of the level above "level" (a buffer of nodes):
+    sorted-pair hashes of nodes 2i and 2i+1, with an odd last node promoted.
+
+    If an executor (e.g. a ProcessPoolExecutor) is given and the level has
+    at least PARALLEL_MIN_PAIRS pairs, the pairs are hashed in chunks of
+    PARALLEL_CHUNK_PAIRS on the executor's workers
+    """
+    view = memoryview(level)
+    n = len(view) // NODE_SIZE
+    paired = (n - n % 2) * NODE_SIZE
+    if executor is not None and n // 2 >= PARALLEL_MIN_PAIRS:
+        step = PARALLEL_CHUNK_PAIRS * 2 * NODE_SIZE
+        chunks = [view[off:min(off + step, paired)].tobytes() for off in range(0, paired, step)]
+        parents = b''.join(executor.map(_hash_pairs, chunks))
+    else:
+        parents = _hash_pairs(view[:paired].tobytes())
+    if n % 2:
+        parents += view[paired:]
+    return parents
+
+
+class MerkleLevel(Sequence):
+    """
+    One level of a FlatMerkleTree, backed by a single buffer
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+
+    def __len__(self):
+        return len(self._buf) // NODE_SIZE
+
+    def _offset(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("node index out of range")
+        return i * NODE_SIZE
+
+    def node(self, i):
+        """
+        Zero-copy view of node i
+        """
+        offset = self._offset(i)
+        return memoryview(self._buf)[offset:offset + NODE_SIZE]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return bytes(self.node(i))
+
+    @property
+    def buffer(self):
+        return self._buf
+
+    def tobytes(self):
+        return bytes(self._buf)
+
+
+class FlatMerkleTree(Sequence):
+    """
+    Merkle tree stored as one buffer per level; tree[0] are the leaves and
+    tree[-1] holds the root
+    """
+
+    def __init__(self, levels, mapping=None):
+        self.levels = [MerkleLevel(buf) for buf in levels]
+        self._mapping = mapping
+
+    @classmethod
+    def from_leaves(cls, leaves, workers=1):
+        """
+        Builds the tree from a list of 32-byte leaves (or one buffer of them).
+        With workers > 1, large levels are hashed on a process pool
+        """
+        level = leaves if isinstance(leaves, (bytes, bytearray, memoryview)) else b''.join(leaves)
+        if len(level) % NODE_SIZE:
+            raise ValueError(f"leaves must be {NODE_SIZE}-byte values")
+        levels = [level]
+        if workers > 1 and len(level) // NODE_SIZE >= 2 * PARALLEL_MIN_PAIRS:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                while len(levels[-1]) > NODE_SIZE:
+                    levels.append(hash_level(levels[-1], executor))
+        else:
+            while len(levels[-1]) > NODE_SIZE:
+                levels.append(hash_level(levels[-1]))
+        return cls(levels)
+
+    @classmethod
+    def from_list(cls, tree):
+        """
+        Converts a tree in build_merkle's list-of-lists format
+        """
+        return cls([b''.join(level) for level in tree])
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, i):
+        return self.levels[i]
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    @property
+    def num_leaves(self):
+        return len(self.levels[0]) if self.levels else 0
+
+    @property
+    def nbytes(self):
+        return sum(len(level.buffer) for level in self.levels)
+
+    def to_list(self):
+        return [list(level) for level in self.levels]
+
+    def save(self, path):
+        """
+        Writes the tree to path (via a temporary file, so readers never see
+        a partly written tree)
+        """
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            f.write(TREE_HEADER.pack(TREE_MAGIC, TREE_VERSION, len(self.levels)))
+            for level in self.levels:
+                f.write(LEVEL_COUNT.pack(len(level)))
+            for level in self.levels:
+                f.write(level.buffer)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a tree written by save(); nodes are only read from disk
+        when they are accessed
+        """
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_levels = TREE_HEADER.unpack_from(mapping)
+        if (magic, version) != (TREE_MAGIC, TREE_VERSION):
+            mapping.close()
+            raise ValueError(f"{path} is not a saved Merkle tree")
+        offset = TREE_HEADER.size
+        counts = []
+        for _ in range(num_levels):
+            counts.append(LEVEL_COUNT.unpack_from(mapping, offset)[0])
+            offset += LEVEL_COUNT.size
+        view = memoryview(mapping)
+        levels = []
+        for count in counts:
+            levels.append(view[offset:offset + count * NODE_SIZE])
+            offset += count * NODE_SIZE
+        return cls(levels, mapping=mapping)
+
+    def close(self):
+        """
+        Releases the memory map of a loaded tree
+        """
+        if self._mapping is not None:
+            for level in self.levels:
+                if isinstance(level.buffer, memoryview):
+                    level.buffer.release()
+            self.levels = []
+            self._mapping.close()
+            self._mapping = None
+
+
+class IncrementalMerkleTree(FlatMerkleTree):
+    """
+    FlatMerkleTree that can grow and change in place.
+
+    append() and update() rewrite only the O(log n) nodes on the path from
+    the leaf to the root; every other node (and so the part of any proof
+    made of them) is left untouched. The layout stays exactly that of
+    build_merkle over the current leaves, odd-node promotion included.
+
+    Node views returned by level.node() must not be held across an
+    append(), since a bytearray cannot grow while it is exported
+    """
+
+    def __init__(self, levels, mapping=None):
+        super().__init__([bytearray(buf) for buf in levels])
+        if not self.levels:
+            self.levels.append(MerkleLevel(bytearray()))
+
+    @classmethod
+    def from_leaves(cls, leaves, workers=1):
+        tree = FlatMerkleTree.from_leaves(leaves, workers=workers)
+        return cls([level.buffer for level in tree.levels])
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a tree written by save() into memory so it can be modified
+        """
+        flat = FlatMerkleTree.load(path)
+        try:
+            return cls([level.buffer for level in flat.levels])
+        finally:
+            flat.close()
+
+    @classmethod
+    def resume(cls, leaves, path):
+        """
+        Returns the tree over "leaves", starting from the snapshot at path
+        when that snapshot's leaves are a prefix of them (only the new
+        leaves are then appended). The snapshot is rewritten if the tree
+        changed or was rebuilt
+        """
+        leaves = list(leaves)
+        tree = None
+        try:
+            tree = cls.load(path)
+        except (OSError, ValueError, struct.error):
+            pass
+
+        if tree is not None and tree.num_leaves <= len(leaves) and \
+                tree.levels[0].buffer == b''.join(leaves[:tree.num_leaves]):
+            if tree.num_leaves == len(leaves):
+                return tree
+            tree.extend(leaves[tree.num_leaves:])
+        else:
+            tree = cls.from_leaves(leaves)
+        tree.save(path)
+        return tree
+
+    def append(self, leaf):
+        """
+        Adds a leaf at the end and returns its index
+        """
+        index = self.num_leaves
+        self._set(0, index, leaf)
+        self._propagate(index)
+        return index
+
+    def extend(self, leaves):
+        for leaf in leaves:
+            self.append(leaf)
+
+    def update(self, index, leaf):
+        """
+        Replaces leaf "index"
+        """
+        if not 0 <= index < self.num_leaves:
+            raise IndexError("leaf index out of range")
+        self._set(0, index, leaf)
+        self._propagate(index)
+
+    def _set(self, level, i, node):
+        if len(node) != NODE_SIZE:
+            raise ValueError(f"nodes must be {NODE_SIZE}-byte values")
+        buf = self.levels[level].buffer
+        offset = i * NODE_SIZE
+        if offset == len(buf):
+            buf += node
+        else:
+            buf[offset:offset + NODE_SIZE] = node
+
+    def _propagate(self, index):
+        """
+        Recomputes the ancestors of node "index" of level 0, adding a level
+        on top when the old root level has grown to two nodes
+        """
+        level = 0
+        while True:
+            nodes = self.levels[level]
+            n = len(nodes)
+            if n == 1 and level == len(self.levels) - 1:
+                return
+            sibling = index ^ 1
+            if sibling < n:
+                parent = hash_pair(nodes.node(index), nodes.node(sibling))
+            else:
+                parent = nodes[index]
+            if level + 1 == len(self.levels):
+                self.levels.append(MerkleLevel(bytearray()))
+            self._set(level + 1, index // 2, parent)
+            index //= 2
+            level += 1
+
+
+def prove_many(tree, indices):
+    """
+    Proofs for many leaves of a tree (FlatMerkleTree or build_merkle's list
+    of lists) in one pass over the levels. Returns a list of proofs in the
+    order of "indices", each identical to prove_merkle(tree, index).
+    Leaves close to each other share most of their siblings, so every
+    sibling node is read from the tree only once
+    """
+    indices = list(indices)
+    positions = {index: index for index in indices}
+    proofs = {index: [] for index in positions}
+    for level in tree[:-1]:
+        n = len(level)
+        siblings = {}
+        for index, pos in positions.items():
+            sibling = pos ^ 1
+            if sibling < n:
+                node = siblings.get(sibling)
+                if node is None:
+                    node = siblings[sibling] = level[sibling]
+                proofs[index].append(node)
+            positions[index] = pos // 2
+    return [proofs[index] for index in indices]
+
+
+def prove_multi(tree, indices):
+    """
+    Builds a multiproof for the leaves at "indices" in the format of
+    OpenZeppelin's MerkleProof.multiProofVerify(proof, proofFlags, root, leaves).
+    Returns (leaves, proof, proof_flags), with leaves in ascending index
+    order (the order multiProofVerify must be given them in).
+
+    multiProofVerify consumes leaves and intermediate hashes as one queue,
+    so a node promoted unhashed past a level (the odd last node) only fits
+    if it is the only node being proven at that level; otherwise a
+    ValueError is raised and prove_many should be used instead. Trees whose
+    size is a power of two never promote
+    """
+    known = sorted(set(indices))
+    if not known:
+        raise ValueError("no leaves to prove")
+    leaves = [tree[0][i] for i in known]
+    proof = []
+    flags = []
+    for level in tree[:-1]:
+        n = len(level)
+        parents = []
+        i = 0
+        while i < len(known):
+            pos = known[i]
+            if pos ^ 1 >= n:
+                if len(known) > 1:
+                    raise ValueError(f"node {pos} is promoted past a level together with other "
+                                     f"proven nodes; no multiproof exists for this layout")
+                parents.append(pos // 2)
+                i += 1
+                continue
+            if pos % 2 == 0 and i + 1 < len(known) and known[i + 1] == pos + 1:
+                flags.append(True)
+                i += 2
+            else:
+                flags.append(False)
+                proof.append(level[pos ^ 1])
+                i += 1
+            parents.append(pos // 2)
+        known = parents
+    return leaves, proof, flags
+
+
+def process_multiproof(leaves, proof, proof_flags):
+    """
+    Python port of OpenZeppelin's MerkleProof.processMultiProof; returns
+    the root the multiproof leads to
+    """
+    total = len(proof_flags)
+    if len(leaves) + len(proof) != total + 1:
+        raise ValueError("MerkleProof: invalid multiproof")
+    hashes = []
+    leaf_pos = hash_pos = proof_pos = 0
+    for flag in proof_flags:
+        if leaf_pos < len(leaves):
+            a = leaves[leaf_pos]
+            leaf_pos += 1
+        else:
+            a = hashes[hash_pos]
+            hash_pos += 1
+        if flag:
+            if leaf_pos < len(leaves):
+                b = leaves[leaf_pos]
+                leaf_pos += 1
+            else:
+                b = hashes[hash_pos]
+                hash_pos += 1
+        else:
+            b = proof[proof_pos]
+            proof_pos += 1
+        hashes.append(hash_pair(a, b))
+    if total > 0:
+        return hashes[-1]
+    return bytes(leaves[0]) if leaves else bytes(proof[0])
+
+
+def verify_multiproof(root, leaves, proof, proof_flags):
+    try:
+        return process_multiproof(leaves, proof, proof_flags) == bytes(root)
+    except (ValueError, IndexError):
+        return False
+
+
+def process_proof(leaf, proof):
+    """
+    Python port of OpenZeppelin's MerkleProof.processProof
+    """
+    node = bytes(leaf)
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node
+
+
+def verify_many(root, leaves, proofs):
+    """
+    Checks a batch of single-leaf proofs against root; returns a list of booleans
+    """
+    root = bytes(root)
+    return [process_proof(leaf, proof) == root for leaf, proof in zip(leaves, proofs)]
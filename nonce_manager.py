@@ -0,0 +1,203 @@
+"""
+Local transaction nonce allocation per (chain, account)
+
+Asking the node for get_transaction_count before every send forces one
+transaction at a time. A NonceManager instead syncs with the node once
+(and again after a restart or an error that shows it is out of step) and
+then hands out consecutive nonces locally, so many transactions can be
+sent back to back.
+
+Nonces that were handed out but never reached the node leave a gap that
+would block every later transaction; they are handed out again before
+any new nonce. Sent transactions that stay unmined for too long are
+re-sent by replace_stuck() with the same nonce and a higher gas price.
+"""
+import threading
+import time
+
+from chain_clients import canonical_chain
+
+# Seconds after which a sent, still unmined transaction counts as stuck
+STUCK_AFTER = 120
+# Gas price factor of a replacement transaction (nodes require at least +10%)
+REPLACEMENT_BUMP = 1.125
+# Send errors that mean our idea of the next nonce is wrong
+NONCE_ERRORS = ('nonce too low', 'nonce too high', 'already known',
+                'replacement transaction underpriced', 'invalid nonce')
+
+
+class NonceManager:
+
+    def __init__(self, chain, address, stuck_after=STUCK_AFTER):
+        self.chain = chain
+        self.address = address
+        self.stuck_after = stuck_after
+        self._lock = threading.Lock()
+        self._next = None
+        # nonce -> [tx hash (None until sent), time handed out / sent, tx dict (if known)]
+        self._pending = {}
+        self._gaps = set()
+
+    @property
+    def needs_sync(self):
+        return self._next is None
+
+    def sync(self, pending_count):
+        """
+        Resets the allocator to the node's pending transaction count.
+        Pending nonces below it have reached the node and are kept; anything
+        at or above it never made it and is forgotten
+        """
+        with self._lock:
+            self._next = pending_count
+            self._gaps.clear()
+            for nonce in [n for n in self._pending if n >= pending_count]:
+                del self._pending[nonce]
+
+    def invalidate(self):
+        """
+        Forces a sync with the node before the next allocation
+        """
+        with self._lock:
+            self._next = None
+
+    def allocate(self):
+        """
+        Returns the nonce to use for the next transaction (the lowest gap if
+        there is one)
+        """
+        with self._lock:
+            if self._next is None:
+                raise RuntimeError(f"nonce manager for {self.address} on {self.chain} needs a sync")
+            if self._gaps:
+                nonce = min(self._gaps)
+                self._gaps.discard(nonce)
+            else:
+                nonce = self._next
+                self._next += 1
+            self._pending[nonce] = [None, time.monotonic(), None]
+            return nonce
+
+    def sent(self, nonce, tx_hash, tx=None):
+        """
+        Records that the transaction with this nonce reached the node; tx
+        (the unsigned transaction dict) lets replace_stuck() re-send it
+        """
+        with self._lock:
+            self._pending[nonce] = [tx_hash, time.monotonic(), tx]
+
+    def confirmed(self, nonce):
+        with self._lock:
+            self._pending.pop(nonce, None)
+
+    def failed(self, nonce, error=None):
+        """
+        Records that the transaction with this nonce was never accepted by
+        the node. The nonce is reused by the next allocate() (or simply
+        handed back if it was the last one out). If the error shows the
+        node disagrees about nonces, the next allocation resyncs instead
+        """
+        with self._lock:
+            self._pending.pop(nonce, None)
+            if error is not None and any(msg in str(error).lower() for msg in NONCE_ERRORS):
+                self._next = None
+                return
+            if self._next is None:
+                return
+            if nonce == self._next - 1:
+                self._next -= 1
+            else:
+                self._gaps.add(nonce)
+
+    def gaps(self):
+        with self._lock:
+            return sorted(self._gaps)
+
+    def overdue(self):
+        """
+        True if some sent transaction has been waiting longer than stuck_after
+        (checked locally, without asking the node whether it was mined)
+        """
+        now = time.monotonic()
+        with self._lock:
+            return any(tx_hash is not None and now - since > self.stuck_after
+                       for tx_hash, since, _ in self._pending.values())
+
+    def stuck(self, mined_count):
+        """
+            mined_count - the account's transaction count at 'latest'
+
+            Forgets pending nonces below mined_count (they are mined) and
+            returns [(nonce, tx_hash, tx)] of sent transactions that have
+            been waiting longer than stuck_after
+        """
+        now = time.monotonic()
+        with self._lock:
+            for nonce in [n for n in self._pending if n < mined_count]:
+                del self._pending[nonce]
+            return sorted((nonce, tx_hash, tx) for nonce, (tx_hash, since, tx) in self._pending.items()
+                          if tx_hash is not None and now - since > self.stuck_after)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_nonce_manager(chain, address):
+    """
+    Returns the process-wide NonceManager of address on chain
+    """
+    key = (canonical_chain(chain), address)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = NonceManager(key[0], address)
+    return manager
+
+
+def next_nonce(w3, chain, address):
+    """
+    Allocates the next nonce of address on chain, syncing the manager
+    with the node first if needed. Returns (manager, nonce)
+    """
+    manager = get_nonce_manager(chain, address)
+    if manager.needs_sync:
+        manager.sync(w3.eth.get_transaction_count(address, 'pending'))
+    return manager, manager.allocate()
+
+
+def replace_stuck(w3, chain, account, bump=REPLACEMENT_BUMP):
+    """
+    Re-sends every stuck transaction of account on chain with the same
+    nonce and a gas price bump times higher (at least the current gas
+    price), so it replaces the original. A stuck transaction whose contents
+    are unknown makes the manager resync with the node instead.
+
+    Costs no RPC call unless a transaction is overdue. Returns
+    [(nonce, old tx hash, new tx hash)] of the replaced transactions
+    """
+    manager = get_nonce_manager(chain, account.address)
+    if not manager.overdue():
+        return []
+    replaced = []
+    for nonce, tx_hash, tx in manager.stuck(w3.eth.get_transaction_count(account.address, 'latest')):
+        if tx is None:
+            print(f"Transaction {tx_hash.hex()} with nonce {nonce} is stuck, resyncing nonces")
+            manager.invalidate()
+            continue
+        new_tx = dict(tx, gasPrice=max(int(tx['gasPrice'] * bump) + 1, w3.eth.gas_price))
+        signed = account.sign_transaction(new_tx)
+        try:
+            new_hash = w3.eth.send_raw_transaction(getattr(signed, 'raw_transaction', None)
+                                                   or getattr(signed, 'rawTransaction'))
+        except Exception as e:
+            if 'nonce too low' in str(e).lower():
+                # Mined since we asked for the transaction count
+                manager.confirmed(nonce)
+            else:
+                print(f"Error replacing stuck transaction {tx_hash.hex()}: {e}")
+            continue
+        manager.sent(nonce, new_hash, new_tx)
+        print(f"Replaced stuck transaction {tx_hash.hex()} (nonce {nonce}) with {new_hash.hex()}")
+        replaced.append((nonce, tx_hash, new_hash))
+    return replaced
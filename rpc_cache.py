@@ -0,0 +1,193 @@
+"""
+On-disk cache of historical RPC responses
+
+eth_getLogs over a fixed block range and eth_getTransactionReceipt of a
+mined transaction never change once the blocks involved are final, so
+rescanning old ranges need not hit the (rate-limited) public endpoints
+again. RpcCache keeps such responses in SQLite, keyed by chain, method
+and the normalised request (block range, address, topics / tx hash), and
+evicts the least recently used entries once the stored responses exceed
+max_bytes.
+
+cache_middleware(chain, cache) builds a web3 middleware that serves and
+fills the cache. It sits next to the provider, so it sees the raw JSON-RPC
+responses, and only stores:
+
+    eth_getLogs               - numeric ranges ending at least
+                                finality_depth blocks below the head
+    eth_getTransactionReceipt - receipts of transactions mined at least
+                                finality_depth blocks below the head
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from web3.middleware import Web3Middleware
+
+# Default cache file, and the most response bytes kept in it
+RPC_CACHE = "rpc_cache.db"
+MAX_CACHE_BYTES = 512 << 20
+# Blocks below the head after which a block counts as final
+FINALITY_DEPTH = 64
+# Seconds a fetched head block number is reused for finality checks
+HEAD_TTL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+
+
+class RpcCache:
+
+    def __init__(self, path=RPC_CACHE, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = self.misses = 0
+
+    def close(self):
+        self.db.close()
+
+    def get(self, key):
+        with self._lock:
+            row = self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value, separators=(',', ':'))
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO responses (key, value, size, used) VALUES (?, ?, ?, ?)",
+                            (key, data, size, time.time()))
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Drops least recently used entries until the cache is 10% below max_bytes
+        """
+        target = self.max_bytes * 9 // 10
+        freed = 0
+        victims = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY used"):
+            if self._size - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._size -= freed
+
+
+def _block(value):
+    """
+    Block number of a request parameter, or None for tags such as 'latest'
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith('0x'):
+        return int(value, 16)
+    return None
+
+
+def _lower(value):
+    if isinstance(value, list):
+        return [_lower(v) for v in value]
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return value.lower() if isinstance(value, str) else value
+
+
+class RpcCacheMiddleware(Web3Middleware):
+
+    def __init__(self, w3, chain, cache, finality_depth=FINALITY_DEPTH):
+        super().__init__(w3)
+        self.chain = chain
+        self.cache = cache
+        self.finality_depth = finality_depth
+        self._head = (None, 0.0)
+
+    def _final_block(self, make_request):
+        """
+        Highest block number that counts as final
+        """
+        head, fetched = self._head
+        if head is None or time.monotonic() - fetched > HEAD_TTL:
+            head = int(make_request('eth_blockNumber', [])['result'], 16)
+            self._head = (head, time.monotonic())
+        return head - self.finality_depth
+
+    def _logs_key(self, params):
+        """
+        (cache key, last block) of an eth_getLogs request over a numeric range, or None
+        """
+        if not params or not isinstance(params[0], dict):
+            return None
+        flt = params[0]
+        if 'blockHash' in flt:
+            return None
+        start, end = _block(flt.get('fromBlock')), _block(flt.get('toBlock'))
+        if start is None or end is None:
+            return None
+        address = flt.get('address')
+        address = sorted(_lower(address)) if isinstance(address, list) else _lower(address)
+        key = json.dumps([self.chain, 'eth_getLogs', start, end, address, _lower(flt.get('topics', []))])
+        return key, end
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method == 'eth_getLogs':
+                key = self._logs_key(params)
+                if key is None:
+                    return make_request(method, params)
+                key, end = key
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+                response = make_request(method, params)
+                if 'error' not in response and end <= self._final_block(make_request):
+                    self.cache.put(key, response)
+                return response
+
+            if method == 'eth_getTransactionReceipt' and params:
+                key = json.dumps([self.chain, method, _lower(params[0])])
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+                response = make_request(method, params)
+                receipt = response.get('result')
+                if receipt and int(receipt['blockNumber'], 16) <= self._final_block(make_request):
+                    self.cache.put(key, response)
+                return response
+
+            return make_request(method, params)
+
+        return middleware
+
+
+def cache_middleware(chain, cache, finality_depth=FINALITY_DEPTH):
+    """
+    Middleware factory for web3's middleware_onion (inject it at layer 0,
+    so it sits next to the provider and sees raw responses)
+    """
+    return lambda w3: RpcCacheMiddleware(w3, chain, cache, finality_depth)
@@ -0,0 +1,143 @@
+"""
+Signing and verifying challenges with one account key
+
+A ChallengeSigner reads its key once and reuses the account for every
+signature. Challenges are signed as EIP-191 personal messages:
+
+    bytes - encode_defunct(primitive=challenge)  (gen_keys)
+    str   - encode_defunct(text=challenge)       (submitProof)
+
+Recovering the signer after each signature (the self-check) roughly
+doubles the cost of signing, so it is only done when verify is set.
+sign_many / verify_many spread large batches over a process pool.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import eth_account
+from eth_account.messages import encode_defunct
+
+# Messages per task handed to a pool worker
+SIGN_CHUNK = 256
+
+
+def encode_challenge(challenge):
+    if isinstance(challenge, str):
+        return encode_defunct(text=challenge)
+    return encode_defunct(primitive=bytes(challenge))
+
+
+def read_key(filename):
+    """
+    First line of a key file, without a 0x prefix
+    """
+    with open(filename, 'r') as f:
+        key = f.readline().strip()
+    assert len(key) > 0, f"Your account {os.path.basename(filename)} is empty"
+    return key.removeprefix('0x')
+
+
+def recover(challenge, signature):
+    """
+    Address that signed challenge, or None if the signature is malformed
+    """
+    try:
+        return eth_account.Account.recover_message(encode_challenge(challenge), signature=signature)
+    except Exception:
+        return None
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# Signer of the current pool worker (set by _init_worker)
+_worker_signer = None
+
+
+def _init_worker(key):
+    global _worker_signer
+    _worker_signer = ChallengeSigner(key)
+
+
+def _sign_chunk(challenges):
+    return [_worker_signer.sign(challenge) for challenge in challenges]
+
+
+def _recover_chunk(pairs):
+    return [recover(challenge, signature) for challenge, signature in pairs]
+
+
+class ChallengeSigner:
+
+    def __init__(self, key, verify=False):
+        """
+            key - hex private key (with or without 0x)
+            verify - recover the signer after every signature and assert it is this account
+        """
+        self.account = eth_account.Account.from_key(key)
+        self.address = self.account.address
+        self.verify = verify
+
+    @classmethod
+    def from_file(cls, filename, verify=False):
+        return cls(read_key(filename), verify)
+
+    def sign(self, challenge):
+        """
+        SignedMessage of challenge (bytes or str)
+        """
+        signed = self.account.sign_message(encode_challenge(challenge))
+        if self.verify:
+            assert recover(challenge, signed.signature) == self.address, f"Failed to sign message properly"
+        return signed
+
+    def sign_many(self, challenges, workers=1, chunksize=SIGN_CHUNK):
+        """
+        SignedMessages of challenges, in order; workers > 1 signs in that many processes
+        """
+        challenges = list(challenges)
+        if workers is None or workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.account.key.hex(),)) as pool:
+                signed = [s for chunk in pool.map(_sign_chunk, _chunks(challenges, chunksize)) for s in chunk]
+        else:
+            signed = [self.account.sign_message(encode_challenge(challenge)) for challenge in challenges]
+        if self.verify:
+            recovered = verify_many(challenges, [s.signature for s in signed], self.address, workers, chunksize)
+            assert all(recovered), f"Failed to sign message properly"
+        return signed
+
+
+def verify_many(challenges, signatures, address, workers=1, chunksize=SIGN_CHUNK):
+    """
+    [bool] saying which signatures of the matching challenges were made by
+    address (one address, or one per challenge); workers > 1 recovers in
+    that many processes
+    """
+    pairs = list(zip(challenges, signatures))
+    if workers is None or workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            recovered = [a for chunk in pool.map(_recover_chunk, _chunks(pairs, chunksize)) for a in chunk]
+    else:
+        recovered = _recover_chunk(pairs)
+    addresses = [address] * len(pairs) if isinstance(address, str) else list(address)
+    return [r is not None and r == a for r, a in zip(recovered, addresses)]
+
+
+_signers = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(filename, verify=False):
+    """
+    Process-wide signer for the key in filename, re-read only when the file changes
+    """
+    path = os.path.abspath(filename)
+    mtime = os.stat(path).st_mtime_ns
+    with _signers_lock:
+        cached = _signers.get((path, verify))
+        if cached is None or cached[0] != mtime:
+            cached = _signers[(path, verify)] = (mtime, ChallengeSigner.from_file(path, verify))
+    return cached[1]
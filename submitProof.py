@@ -1,10 +1,40 @@
 import eth_account
+import math
+import os
 import random
 import string
-import json
 from pathlib import Path
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware  # Necessary for POA chains
+import numpy as np
+from chain_clients import get_contract, get_w3, load_contract_info
+from claim_index import ClaimIndex
+from merkle_tree import IncrementalMerkleTree, hash_pair as merkle_hash_pair
+from nonce_manager import next_nonce, replace_stuck
+from signer import get_signer
+from tx_builder import get_tx_builder
+
+# File (next to this one) holding the primes computed so far
+PRIMES_CACHE = "primes_cache.npy"
+# File (next to this one) holding a snapshot of the Merkle tree
+MERKLE_SNAPSHOT = "merkle_tree.bin"
+# File (next to this one) holding the local index of claimed primes
+CLAIM_INDEX = "claim_index.json"
+# The claim contract's event for a claimed prime and its argument holding
+# the leaf. The claim index is only used when both are set (it does not
+# guess them from the ABI); otherwise primes are picked at random
+CLAIM_EVENT = None
+CLAIM_LEAF_ARG = None
+# First block scanned for claim events: the claim contract's deployment
+# block. If None, the first sync only covers the last CLAIM_LOOKBACK blocks,
+# so claims older than that are not in the index; such a prime is found out
+# when its claim reverts, and then recorded as claimed. Later runs resume
+# from the saved index, whatever the lookback
+CLAIM_START_BLOCK = None
+CLAIM_LOOKBACK = 50000
+# Least gas limit of a submit() (the memoized estimate of one claim can be
+# short for a claim whose proof takes a costlier path)
+SUBMIT_GAS = 500000
+# Numbers sieved per segment
+SIEVE_SEGMENT = 1 << 18
 
 
 def merkle_assignment():
@@ -22,17 +52,30 @@ def merkle_assignment():
     leaves = convert_leaves(primes)
 
     # Build a Merkle tree using the bytes32 leaves as the Merkle tree's leaves
-    tree = build_merkle(leaves)
+    # (same layout as build_merkle, one buffer per level). The tree is
+    # resumed from the last run's snapshot and only rebuilt if the leaves changed
+    tree = IncrementalMerkleTree.resume(leaves, Path(__file__).parent.absolute() / MERKLE_SNAPSHOT)
+
+    # Pick a prime nobody has claimed yet. With CLAIM_EVENT set, a local
+    # index kept in sync with the contract's claim events is used, so no
+    # transaction is wasted on a prime that is known to be taken; without
+    # it, primes are guessed as before
+    claims = open_claim_index(leaves)
 
     # Try multiple primes if needed
     max_attempts = 10
     for attempt in range(max_attempts):
-        # Select from lower indices where more primes are unclaimed
-        random_leaf_index = random.randint(20, 100)  # Focus on lower indices
-        
+        if claims is None:
+            # Select from lower indices where more primes are unclaimed
+            random_leaf_index = random.randint(20, 100)
+        else:
+            random_leaf_index = claims.pick()
+            if random_leaf_index is None:
+                print("All primes have already been claimed")
+                return None
+
         print(f"\nAttempt {attempt + 1}/{max_attempts}")
         print(f"Attempting to claim prime at index {random_leaf_index}: {primes[random_leaf_index]}")
-        
         proof = prove_merkle(tree, random_leaf_index)
 
         # This is the same way the grader generates a challenge for sign_challenge()
@@ -40,61 +83,129 @@ def merkle_assignment():
         # Sign the challenge to prove to the grader you hold the account
         addr, sig = sign_challenge(challenge)
 
-        if sign_challenge_verify(challenge, addr, sig):
-            try:
-                # Pass the leaf directly (it's already bytes32, not hashed)
-                tx_hash = send_signed_msg(proof, leaves[random_leaf_index])
-                
-                # Check transaction status
-                w3 = connect_to('bsc')
-                receipt = w3.eth.get_transaction_receipt(tx_hash)
-                
-                if receipt['status'] == 1:
-                    print(f"\n🎉 Success! Prime {primes[random_leaf_index]} has been claimed!")
-                    print(f"Transaction Hash: {tx_hash}")
-                    print(f"Block Number: {receipt['blockNumber']}")
-                    return tx_hash
-                else:
-                    print(f"Transaction failed, trying another prime...")
-                    continue
-                    
-            except Exception as e:
-                print(f"Error: {e}")
-                print(f"Trying another prime...")
-                continue
-        else:
+        if not sign_challenge_verify(challenge, addr, sig):
             print("Signature verification failed")
             return None
-    
+
+        try:
+            # Pass the leaf directly (it's already bytes32, not hashed)
+            tx_hash = send_signed_msg(proof, leaves[random_leaf_index])
+            receipt = connect_to('bsc').eth.get_transaction_receipt(tx_hash)
+        except Exception as e:
+            print(f"Error: {e}")
+            print(f"Trying another prime...")
+            continue
+
+        if claims is not None:
+            # Claimed now, or (the claim reverted) by someone the index has not seen
+            claims.mark_claimed(random_leaf_index)
+            claims.save()
+        if receipt['status'] != 1:
+            print(f"Transaction failed, trying another prime...")
+            continue
+
+        print(f"\n🎉 Success! Prime {primes[random_leaf_index]} has been claimed!")
+        print(f"Transaction Hash: {tx_hash}")
+        print(f"Block Number: {receipt['blockNumber']}")
+        return tx_hash
+
     print(f"\nFailed {max_attempts} attempts.")
-    print("It's possible all randomly selected primes are already claimed.")
-    print("Please run 'python diagnose.py' to find an unclaimed prime.")
+    print("It's possible all selected primes are already claimed.")
+    return None
+
+
+def open_claim_index(leaves):
+    """
+        The claim index of leaves (see claim_index), synced with the claim
+        contract on bsc, or None if CLAIM_EVENT / CLAIM_LEAF_ARG are not set
+    """
+    if CLAIM_EVENT is None or CLAIM_LEAF_ARG is None:
+        return None
+    chain = 'bsc'
+    address, abi = get_contract_info(chain)
+    w3 = connect_to(chain)
+    contract = get_contract(chain, address, abi)
+    start_block = CLAIM_START_BLOCK
+    if start_block is None:
+        start_block = max(0, w3.eth.block_number - CLAIM_LOOKBACK)
+    claims = ClaimIndex(w3, contract, leaves, CLAIM_EVENT, CLAIM_LEAF_ARG, start_block,
+                        path=Path(__file__).parent.absolute() / CLAIM_INDEX)
+    claims.sync()
+    return claims
 
 
 def generate_primes(num_primes):
     """
         Function to generate the first 'num_primes' prime numbers
         returns list (with length n) of primes (as ints) in ascending order
+
+        The primes are produced by a segmented sieve and cached in
+        "primes_cache.npy" next to this file; any later call asking for
+        no more primes than the cache holds is served straight from it
     """
-    primes_list = []
-    candidate = 2
-    
-    while len(primes_list) < num_primes:
-        is_prime = True
-        # Check if candidate is divisible by any prime found so far
-        for prime in primes_list:
-            if prime * prime > candidate:
-                break
-            if candidate % prime == 0:
-                is_prime = False
-                break
-        
-        if is_prime:
-            primes_list.append(candidate)
-        
-        candidate += 1
-    
-    return primes_list
+    if num_primes <= 0:
+        return []
+
+    cache_file = Path(__file__).parent.absolute() / PRIMES_CACHE
+    try:
+        cached = np.load(cache_file, mmap_mode='r')
+        if len(cached) >= num_primes:
+            return cached[:num_primes].tolist()
+    except (OSError, ValueError):
+        pass
+
+    primes = _sieve_primes(num_primes)
+    tmp = cache_file.with_name(f"{cache_file.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp, primes)
+    os.replace(tmp, cache_file)
+    return primes.tolist()
+
+
+def _prime_bound(n):
+    """
+        Upper bound on the n-th prime: p_n < n (ln n + ln ln n) for n >= 6
+    """
+    if n < 6:
+        return 13
+    return int(n * (math.log(n) + math.log(math.log(n)))) + 1
+
+
+def _sieve_primes(num_primes):
+    """
+        Segmented sieve of Eratosthenes up to _prime_bound(num_primes),
+        returns the first num_primes primes as a NumPy array
+    """
+    bound = _prime_bound(num_primes)
+    root = math.isqrt(bound)
+
+    # Base primes up to sqrt(bound) with a plain sieve
+    is_prime = np.ones(root + 1, dtype=bool)
+    is_prime[:2] = False
+    for p in range(2, math.isqrt(root) + 1):
+        if is_prime[p]:
+            is_prime[p * p::p] = False
+    base = np.flatnonzero(is_prime)
+
+    dtype = np.uint32 if bound < 2 ** 32 else np.uint64
+    found = [base.astype(dtype)]
+    count = len(base)
+    segment = np.empty(SIEVE_SEGMENT, dtype=bool)
+    low = root + 1
+    while count < num_primes and low <= bound:
+        high = min(low + SIEVE_SEGMENT, bound + 1)
+        seg = segment[:high - low]
+        seg[:] = True
+        for p in base.tolist():
+            start = max(p * p, -(-low // p) * p)
+            if start >= high:
+                continue
+            seg[start - low::p] = False
+        chunk = (np.flatnonzero(seg) + low).astype(dtype)
+        found.append(chunk)
+        count += len(chunk)
+        low = high
+
+    return np.concatenate(found)[:num_primes]
 
 
 def convert_leaves(primes_list):
@@ -176,18 +287,11 @@ def sign_challenge(challenge):
         This method is to allow the auto-grader to verify that you have
         claimed a prime
     """
-    acct = get_account()
+    # Signs encode_defunct(text=challenge) with the key loaded once (see signer)
+    signer = get_signer(Path(__file__).parent.absolute().joinpath('sk.txt'))
+    eth_sig_obj = signer.sign(challenge)
 
-    addr = acct.address
-    eth_sk = acct.key
-
-    # Encode the message in Ethereum's standard format
-    eth_encoded_msg = eth_account.messages.encode_defunct(text=challenge)
-    
-    # Sign the message
-    eth_sig_obj = eth_account.Account.sign_message(eth_encoded_msg, private_key=eth_sk)
-
-    return addr, eth_sig_obj.signature.hex()
+    return signer.address, eth_sig_obj.signature.hex()
 
 
 def send_signed_msg(proof, random_leaf):
@@ -203,31 +307,30 @@ def send_signed_msg(proof, random_leaf):
     w3 = connect_to(chain)
 
     # Create contract instance
-    contract = w3.eth.contract(address=address, abi=abi)
-    
-    # IMPORTANT: Get fresh nonce each time
-    nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-    
-    # Build the transaction
-    # Note: Contract expects (proof, leaf) order based on ABI
-    txn = contract.functions.submit(proof, random_leaf).build_transaction({
-        'from': acct.address,
-        'nonce': nonce,
-        'gas': 500000,
-        'gasPrice': w3.eth.gas_price
-    })
+    contract = get_contract(chain, address, abi)
     
-    # Sign the transaction
-    signed_txn = w3.eth.account.sign_transaction(txn, private_key=acct.key)
-    
-    # Send the transaction
-    # Handle both old and new attribute names for compatibility
-    raw_tx = getattr(signed_txn, 'raw_transaction', None) or getattr(signed_txn, 'rawTransaction')
-    tx_hash = w3.eth.send_raw_transaction(raw_tx)
+    # Nonces are handed out locally (synced with the node's pending count
+    # on first use), so several claims can be sent back to back. An earlier
+    # claim still unmined after nonce_manager.STUCK_AFTER is replaced first
+    replace_stuck(w3, chain, acct)
+    nonces, nonce = next_nonce(w3, chain, acct.address)
+
+    try:
+        # Build and sign offline (chain id, gas price and the gas estimate of
+        # submit() are cached, see tx_builder) and send the raw transaction
+        # Note: Contract expects (proof, leaf) order based on ABI
+        builder = get_tx_builder(chain, acct)
+        tx = builder.build(contract.functions.submit(proof, random_leaf), nonce, min_gas=SUBMIT_GAS)
+        tx_hash = w3.eth.send_raw_transaction(builder.sign(tx))
+    except Exception as e:
+        nonces.failed(nonce, e)
+        raise
+    nonces.sent(nonce, tx_hash, tx)
     
     # Wait for transaction receipt
     print(f"Waiting for transaction to be mined...")
     receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    nonces.confirmed(nonce)
     
     if receipt['status'] == 1:
         print(f"Transaction successful! Block: {receipt['blockNumber']}")
@@ -243,20 +346,13 @@ def send_signed_msg(proof, random_leaf):
 def connect_to(chain):
     """
         Takes a chain ('avax' or 'bsc') and returns a web3 instance
-        connected to that chain.
+        connected to that chain (shared with the rest of the process,
+        see chain_clients)
     """
     if chain not in ['avax','bsc']:
         print(f"{chain} is not a valid option for 'connect_to()'")
         return None
-    if chain == 'avax':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc"  # AVAX C-chain testnet
-    else:
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/"  # BSC testnet
-    w3 = Web3(Web3.HTTPProvider(api_url))
-    # inject the poa compatibility middleware to the innermost layer
-    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-
-    return w3
+    return get_w3(chain)
 
 
 def get_account():
@@ -265,11 +361,7 @@ def get_account():
         in "sk.txt"
     """
     cur_dir = Path(__file__).parent.absolute()
-    with open(cur_dir.joinpath('sk.txt'), 'r') as f:
-        sk = f.readline().rstrip()
-    if sk[0:2] == "0x":
-        sk = sk[2:]
-    return eth_account.Account.from_key(sk)
+    return get_signer(cur_dir.joinpath('sk.txt')).account
 
 
 def get_contract_info(chain):
@@ -280,9 +372,7 @@ def get_contract_info(chain):
     contract_file = Path(__file__).parent.absolute() / "contract_info.json"
     if not contract_file.is_file():
         contract_file = Path(__file__).parent.parent.parent / "tests" / "contract_info.json"
-    with open(contract_file, "r") as f:
-        d = json.load(f)
-        d = d[chain]
+    d = load_contract_info(contract_file)[chain]
     return d['address'], d['abi']
 
 
@@ -312,11 +402,12 @@ def hash_pair(a, b):
 
         Another potential gotcha, if you have a prime number (as an int) bytes(prime) will *not* give you the byte representation of the integer prime
         Instead, you must call int.to_bytes(prime,'big').
+
+        The hash is computed on the raw 64-byte concatenation (see
+        merkle_tree.hash_pair), which gives the same digest as
+        solidity_keccak(['bytes32', 'bytes32'], ...) without the ABI encoder
     """
-    if a < b:
-        return Web3.solidity_keccak(['bytes32', 'bytes32'], [a, b])
-    else:
-        return Web3.solidity_keccak(['bytes32', 'bytes32'], [b, a])
+    return merkle_hash_pair(a, b)
 
 
 if __name__ == "__main__":
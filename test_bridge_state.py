@@ -0,0 +1,159 @@
+"""
+BridgeState's processed-event store on a temporary SQLite file
+"""
+import sqlite3
+
+import pytest
+
+import bridge_state
+from bridge_state import BridgeState
+
+CHAIN = 'source'
+RELAY_TX = '0x' + 'ab' * 32
+BATCH_TX = '0x' + 'cd' * 32
+
+
+def event(i, block=None):
+    return {'transactionHash': bytes([i]) * 32, 'logIndex': 0, 'blockNumber': 100 + i if block is None else block}
+
+
+@pytest.fixture
+def state(tmp_path):
+    with BridgeState(tmp_path / "bridge_state.db") as state:
+        yield state
+
+
+def age(state, seconds):
+    state.db.execute("UPDATE processed SET updated = updated - ?", (seconds,))
+
+
+def test_repeated_claim(state):
+    events = [event(1), event(2)]
+    assert state.claim(CHAIN, events) == events
+    assert state.claim(CHAIN, events + [event(3)]) == [event(3)]
+    # Events of the other chain are separate
+    assert state.claim('destination', events) == events
+
+    state.mark_sent(CHAIN, [event(1)], RELAY_TX)
+    state.mark_done(CHAIN, [event(2)])
+    assert state.claim(CHAIN, events) == []
+    assert [state.status(CHAIN, e) for e in events] == ['sent', 'done']
+
+
+def test_release_only_unsent_events(state):
+    events = [event(1), event(2)]
+    state.claim(CHAIN, events)
+    state.mark_sent(CHAIN, [event(1)], RELAY_TX)
+    state.release(CHAIN, events)
+    assert state.status(CHAIN, event(1)) == 'sent'
+    assert state.status(CHAIN, event(2)) is None
+    assert state.claim(CHAIN, events) == [event(2)]
+
+
+def test_settle_single_transaction(state):
+    state.claim(CHAIN, [event(1), event(2)])
+    state.mark_sent(CHAIN, [event(1)], RELAY_TX)
+    state.mark_sent(CHAIN, [event(2)], BATCH_TX)
+    assert sorted(state.unconfirmed(CHAIN)) == [RELAY_TX, BATCH_TX]
+
+    assert state.settle(CHAIN, bytes.fromhex(RELAY_TX[2:]), True) == []
+    assert state.settle(CHAIN, BATCH_TX, False) == []
+    assert state.status(CHAIN, event(1)) == 'done'
+    assert state.status(CHAIN, event(2)) == 'failed'
+    assert state.unconfirmed(CHAIN) == []
+
+
+def test_reverted_batch_is_released(state):
+    events = [event(1), event(2), event(3, block=101)]
+    state.claim(CHAIN, events)
+    state.mark_sent(CHAIN, events, BATCH_TX)
+
+    assert sorted(state.settle(CHAIN, BATCH_TX, False)) == [101, 101, 102]
+    assert [state.status(CHAIN, e) for e in events] == [None, None, None]
+    # Settling again finds nothing, and the events can be relayed again
+    assert state.settle(CHAIN, BATCH_TX, False) == []
+    assert state.claim(CHAIN, events) == events
+
+
+def test_unsend(state):
+    events = [event(1), event(2)]
+    state.claim(CHAIN, events)
+    state.mark_sent(CHAIN, events, BATCH_TX)
+    state.unsend(CHAIN, events)
+    assert state.unconfirmed(CHAIN) == []
+    assert [state.status(CHAIN, e) for e in events] == ['claimed', 'claimed']
+    state.release(CHAIN, events)
+    assert state.claim(CHAIN, events) == events
+
+
+def test_claim_timeout_takeover(state):
+    events = [event(1), event(2)]
+    state.claim(CHAIN, events)
+    state.mark_sent(CHAIN, [event(2)], RELAY_TX)
+
+    age(state, bridge_state.CLAIM_TIMEOUT - 60)
+    assert state.claim(CHAIN, events) == []
+    # The claim of a run that died is taken over; a sent event never is
+    age(state, 120)
+    assert state.claim(CHAIN, events) == [event(1)]
+    assert state.status(CHAIN, event(2)) == 'sent'
+
+
+def test_touch_renews_a_claim(state):
+    state.claim(CHAIN, [event(1)])
+    age(state, bridge_state.CLAIM_TIMEOUT + 60)
+    state.touch(CHAIN, [event(1)])
+    assert state.claim(CHAIN, [event(1)]) == []
+
+
+def test_replace_tx(state):
+    state.claim(CHAIN, [event(1)])
+    state.mark_sent(CHAIN, [event(1)], RELAY_TX)
+    state.replace_tx(RELAY_TX, BATCH_TX)
+    assert state.unconfirmed(CHAIN) == [BATCH_TX]
+    # The original may still be the one mined
+    assert state.relay_txs(BATCH_TX) == [BATCH_TX, RELAY_TX]
+    third = '0x' + 'ef' * 32
+    state.replace_tx(BATCH_TX, third)
+    assert state.relay_txs(third) == [third, BATCH_TX, RELAY_TX]
+
+    state.settle(CHAIN, third, True)
+    assert state.status(CHAIN, event(1)) == 'done'
+    assert state.relay_txs(third) == [third]
+
+
+def test_checkpoints(state):
+    assert state.get_checkpoint(CHAIN, '0x1') is None
+    state.set_checkpoint(CHAIN, '0x1', 10)
+    state.set_checkpoint(CHAIN, '0x1', 12)
+    assert state.get_checkpoint(CHAIN, '0x1') == 12
+    assert state.get_checkpoint('destination', '0x1') is None
+
+
+def test_database_without_relay_tx(tmp_path):
+    path = tmp_path / "bridge_state.db"
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE processed (
+            chain TEXT NOT NULL,
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER NOT NULL,
+            block_number INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (chain, tx_hash, log_index)
+        );
+    """)
+    tx_hash = (bytes([1]) * 32).hex()
+    db.execute("INSERT INTO processed VALUES (?, ?, 0, 101, 'done', 0)", (CHAIN, tx_hash))
+    db.commit()
+    db.close()
+
+    with BridgeState(path) as state:
+        assert state.status(CHAIN, event(1)) == 'done'
+        assert state.claim(CHAIN, [event(1), event(2)]) == [event(2)]
+        state.mark_sent(CHAIN, [event(2)], RELAY_TX)
+        assert state.unconfirmed(CHAIN) == [RELAY_TX]
+    # Opening the migrated store again leaves it as it is
+    with BridgeState(path) as state:
+        assert state.status(CHAIN, event(2)) == 'sent'
@@ -0,0 +1,118 @@
+"""
+ClaimIndex against a local eth-tester chain
+
+The stand-in claim contract emits Claimed(address indexed claimer, bytes32 leaf)
+with the first argument of whatever function is called on it.
+"""
+import random
+
+import pytest
+from eth_utils import keccak
+from web3 import EthereumTesterProvider, Web3
+
+from claim_index import ClaimIndex
+
+CLAIMED_TOPIC = keccak(text="Claimed(address,bytes32)")
+# mstore(0, calldataload(4)); log2(0, 32, topic, caller())
+RUNTIME = bytes.fromhex("600435600052337f") + CLAIMED_TOPIC + bytes.fromhex("60206000a200")
+ABI = [
+    {'type': 'function', 'name': 'claim', 'stateMutability': 'nonpayable', 'outputs': [],
+     'inputs': [{'name': 'leaf', 'type': 'bytes32'}]},
+    {'type': 'event', 'name': 'Claimed', 'anonymous': False,
+     'inputs': [{'name': 'claimer', 'type': 'address', 'indexed': True},
+                {'name': 'leaf', 'type': 'bytes32', 'indexed': False}]},
+]
+
+LEAVES = [i.to_bytes(32, 'big') for i in (2, 3, 5, 7, 11, 13, 17, 19)]
+
+
+@pytest.fixture
+def chain(deploy_runtime):
+    w3 = Web3(EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+    address, deployed = deploy_runtime(w3, RUNTIME)
+    return w3, w3.eth.contract(address=address, abi=ABI), deployed
+
+
+def claim(w3, contract, leaf):
+    w3.eth.wait_for_transaction_receipt(contract.functions.claim(leaf).transact())
+
+
+def test_sync_and_pick(chain):
+    w3, contract, deployed = chain
+    claim(w3, contract, LEAVES[1])
+    claim(w3, contract, LEAVES[4])
+    claim(w3, contract, (23).to_bytes(32, 'big'))  # not one of our leaves
+
+    index = ClaimIndex(w3, contract, LEAVES, 'Claimed', 'leaf', deployed)
+    assert index.sync() == 2
+    assert index.claimed == {1, 4}
+    assert len(index) == len(LEAVES) - 2
+    assert index.last_block == w3.eth.block_number
+
+    rng = random.Random(0)
+    picks = {index.pick(rng) for _ in range(200)}
+    assert picks == set(range(len(LEAVES))) - {1, 4}
+
+
+def test_incremental_sync(chain):
+    w3, contract, deployed = chain
+    claim(w3, contract, LEAVES[0])
+    index = ClaimIndex(w3, contract, LEAVES, 'Claimed', 'leaf', deployed)
+    assert index.sync() == 1
+    synced = index.last_block
+
+    # Nothing new: no blocks are scanned again
+    assert index.sync() == 0
+    assert index.last_block == synced
+
+    claim(w3, contract, LEAVES[6])
+    claim(w3, contract, LEAVES[0])  # claimed again, already known
+    assert index.sync(chunk=1) == 1
+    assert index.claimed == {0, 6}
+    assert index.last_block == synced + 2
+
+
+def test_resume_from_file(chain, tmp_path):
+    w3, contract, deployed = chain
+    path = tmp_path / "claim_index.json"
+    claim(w3, contract, LEAVES[2])
+    index = ClaimIndex(w3, contract, LEAVES, 'Claimed', 'leaf', deployed, path=path)
+    index.sync()
+
+    claim(w3, contract, LEAVES[3])
+    resumed = ClaimIndex(w3, contract, LEAVES, 'Claimed', 'leaf', deployed, path=path)
+    assert resumed.claimed == {2}
+    assert resumed.last_block == index.last_block
+    assert resumed.sync() == 1
+    assert resumed.claimed == {2, 3}
+
+    # A later start block does not skip the blocks since the saved sync
+    claim(w3, contract, LEAVES[5])
+    later = ClaimIndex(w3, contract, LEAVES, 'Claimed', 'leaf', w3.eth.block_number + 1, path=path)
+    assert later.last_block == resumed.last_block
+    assert later.sync() == 1
+    assert later.claimed == {2, 3, 5}
+
+    # A different leaf set does not reuse the saved index
+    other = ClaimIndex(w3, contract, LEAVES[:4], 'Claimed', 'leaf', deployed, path=path)
+    assert other.claimed == set()
+
+
+def test_pick_when_everything_is_claimed(chain):
+    w3, contract, deployed = chain
+    for leaf in LEAVES[:2]:
+        claim(w3, contract, leaf)
+    index = ClaimIndex(w3, contract, LEAVES[:2], 'Claimed', 'leaf', deployed)
+    index.sync()
+    assert index.pick() is None
+
+
+def test_claim_event_must_exist(chain):
+    w3, contract, deployed = chain
+    with pytest.raises(ValueError):
+        ClaimIndex(w3, contract, LEAVES, 'Claim', 'leaf', deployed)
+    with pytest.raises(ValueError):
+        ClaimIndex(w3, contract, LEAVES, 'Claimed', 'prime', deployed)
+    with pytest.raises(ValueError):
+        ClaimIndex(w3, contract, LEAVES, 'Claimed', 'claimer', deployed)
@@ -0,0 +1,173 @@
+"""
+BlockFollower against a local eth-tester chain, with reorgs made by
+reverting to a snapshot and mining a different chain from there
+
+The stand-in contract logs the first word of its calldata (LOG1 with a
+fixed topic), so every transaction to it leaves one recognisable log.
+"""
+import pytest
+from eth_tester import EthereumTester
+from eth_utils import keccak
+from web3 import EthereumTesterProvider, Web3
+from web3.exceptions import BlockNotFound
+
+from follower import BlockFollower
+
+TOPIC = keccak(text="Note(bytes32)")
+# mstore(0, calldataload(0)); log1(0, 32, topic)
+RUNTIME = bytes.fromhex("600035600052" "7f") + TOPIC + bytes.fromhex("60206000a100")
+
+
+@pytest.fixture
+def chain(deploy_runtime):
+    tester = EthereumTester()
+    w3 = Web3(EthereumTesterProvider(tester))
+    w3.eth.default_account = w3.eth.accounts[0]
+    address, _ = deploy_runtime(w3, RUNTIME)
+    return tester, w3, address
+
+
+def note(w3, address, value):
+    """
+    Mines a block with one log carrying value
+    """
+    tx = w3.eth.send_transaction({'to': address, 'data': value.to_bytes(32, 'big'), 'gas': 100000})
+    return w3.eth.wait_for_transaction_receipt(tx)['blockNumber']
+
+
+def notes(logs):
+    return [int.from_bytes(bytes(log['data']), 'big') for log in logs]
+
+
+def summary(changes):
+    return [(kind, number, notes(logs)) for kind, number, _, logs in changes]
+
+
+class StandInEth:
+    """
+    w3.eth of the eth-tester chain with what BlockFollower needs on top:
+    get_logs by blockHash (EIP-234, which eth-tester lacks), and a
+    get_block that raises BlockNotFound for the next failures calls, like
+    a node that has not seen (or has pruned) a block
+    """
+
+    def __init__(self, eth):
+        self._eth = eth
+        self.failures = 0
+
+    def __getattr__(self, name):
+        return getattr(self._eth, name)
+
+    def get_block(self, number):
+        if self.failures:
+            self.failures -= 1
+            raise BlockNotFound(f"Block with id: {number} not found.")
+        return self._eth.get_block(number)
+
+    def get_logs(self, params):
+        params = dict(params)
+        block_hash = params.pop('blockHash', None)
+        if block_hash is None:
+            return self._eth.get_logs(params)
+        number = self._eth.get_block(block_hash)['number']
+        logs = self._eth.get_logs(dict(params, fromBlock=number, toBlock=number))
+        return [log for log in logs if log['blockHash'] == block_hash]
+
+
+class StandInWeb3:
+
+    def __init__(self, w3):
+        self.eth = StandInEth(w3.eth)
+
+
+def follower_at_head(w3, address, window=64):
+    follower = BlockFollower(StandInWeb3(w3), {'address': address, 'topics': [TOPIC]}, window=window)
+    follower.poll()
+    return follower
+
+
+def test_new_blocks(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address)
+    first = note(w3, address, 1)
+    second = note(w3, address, 2)
+    assert summary(follower.poll()) == [('add', first, [1]), ('add', second, [2])]
+    assert follower.poll() == []
+    assert follower.head == (second, w3.eth.get_block(second)['hash'])
+
+
+def test_falling_behind_the_window(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address, window=3)
+    numbers = [note(w3, address, value) for value in range(1, 8)]
+    # The oldest four come by range, the rest block by block, and nothing is mistaken for a reorg
+    assert summary(follower.poll()) == [('add', number, [value]) for value, number in enumerate(numbers, 1)]
+    assert follower.poll() == []
+
+    number = note(w3, address, 8)
+    assert summary(follower.poll()) == [('add', number, [8])]
+
+
+def test_reorg_at_equal_height(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address)
+    snapshot = tester.take_snapshot()
+    number = note(w3, address, 1)
+    assert summary(follower.poll()) == [('add', number, [1])]
+
+    # The head is replaced by a block of the same height
+    tester.revert_to_snapshot(snapshot)
+    assert note(w3, address, 2) == number
+    assert summary(follower.poll()) == [('remove', number, [1]), ('add', number, [2])]
+    assert follower.poll() == []
+
+
+def test_reorg_onto_longer_chain(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address)
+    snapshot = tester.take_snapshot()
+    first = note(w3, address, 1)
+    second = note(w3, address, 2)
+    follower.poll()
+
+    tester.revert_to_snapshot(snapshot)
+    tester.mine_blocks(1)
+    assert note(w3, address, 3) == second
+    assert note(w3, address, 4) == second + 1
+    assert summary(follower.poll()) == [
+        ('remove', second, [2]),
+        ('remove', first, [1]),
+        ('add', first, []),
+        ('add', second, [3]),
+        ('add', second + 1, [4]),
+    ]
+
+
+def test_reorg_onto_shorter_chain(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address)
+    snapshot = tester.take_snapshot()
+    first = note(w3, address, 1)
+    note(w3, address, 2)
+    follower.poll()
+
+    # Until the new chain reaches one of our heights nothing can be compared
+    tester.revert_to_snapshot(snapshot)
+    assert follower.poll() == []
+    assert note(w3, address, 3) == first
+    assert summary(follower.poll()) == [('remove', first + 1, [2]), ('remove', first, [1]), ('add', first, [3])]
+
+
+def test_missing_block_is_retried(chain):
+    tester, w3, address = chain
+    follower = follower_at_head(w3, address)
+    number = note(w3, address, 1)
+
+    follower.w3.eth.failures = 1
+    assert follower.poll() == []
+    assert summary(follower.poll()) == [('add', number, [1])]
+
+    # Same-height check of the head
+    follower.w3.eth.failures = 1
+    assert follower.poll() == []
+    assert follower.head[0] == number
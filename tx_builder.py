@@ -0,0 +1,123 @@
+"""
+Building and signing contract transactions with as few RPC calls as possible
+
+A TxBuilder fills in every field of a transaction itself, so web3 never
+has to ask the node for one:
+
+    chainId  - fetched once per process (chain_clients.get_chain_id)
+    gasPrice - fetched at most once per block time of the chain and shared
+               by every builder of that chain
+    gas      - eth_estimateGas of the first call of each (chain, contract,
+               function, argument shape), times GAS_MARGIN, reused after that;
+               never below the caller's min_gas, since a later call of the
+               same shape can take a costlier path than the estimated one
+    nonce    - passed in by the caller (see nonce_manager)
+
+Signing happens locally, so sending a transaction whose gas estimate is
+already known costs a single eth_sendRawTransaction.
+"""
+import threading
+import time
+
+from chain_clients import canonical_chain, get_chain_id, get_w3
+
+# Headroom added to gas estimates
+GAS_MARGIN = 1.2
+# Seconds a gas price is reused: about one block on each chain
+BLOCK_TIMES = {
+    'avax': 2.0,
+    'bsc': 3.0,
+}
+
+_lock = threading.Lock()
+_gas_prices = {}
+_gas_estimates = {}
+_builders = {}
+
+
+def _arg_shape(value):
+    """
+    Lengths of the array arguments of a call (gas of the batch functions scales with them)
+    """
+    if isinstance(value, (list, tuple)):
+        return (len(value),) + tuple(s for v in value for s in _arg_shape(v))
+    return ()
+
+
+def gas_price(chain):
+    """
+    Gas price of chain, re-fetched at most once per block time
+    """
+    chain = canonical_chain(chain)
+    cached = _gas_prices.get(chain)
+    now = time.monotonic()
+    if cached is None or now - cached[1] > BLOCK_TIMES.get(chain, 1.0):
+        cached = _gas_prices[chain] = (get_w3(chain).eth.gas_price, now)
+    return cached[0]
+
+
+class TxBuilder:
+
+    def __init__(self, chain, account):
+        """
+            chain - 'avax' / 'bsc' (or 'source' / 'destination')
+            account - eth_account LocalAccount that signs and pays for the transactions
+        """
+        self.chain = canonical_chain(chain)
+        self.account = account
+        self.address = account.address
+        self.w3 = get_w3(self.chain)
+
+    def estimate_gas(self, fn, margin=GAS_MARGIN, memoize=True, min_gas=0):
+        """
+        Gas limit for the contract call fn: its estimate times margin,
+        memoized per (contract, function, argument shape) unless memoize is
+        off, and at least min_gas. Raises if the node says the call would revert
+        """
+        key = (self.chain, fn.address, fn.fn_name, _arg_shape(fn.args), margin)
+        gas = _gas_estimates.get(key) if memoize else None
+        if gas is None:
+            gas = int(fn.estimate_gas({'from': self.address}) * margin)
+            if memoize:
+                with _lock:
+                    _gas_estimates[key] = gas
+        return max(gas, min_gas)
+
+    def build(self, fn, nonce, gas=None, gas_price_wei=None, chain_id=None, min_gas=0):
+        """
+        The complete transaction dict of the contract call fn; fields that are
+        not given come from the caches above (a gas estimate no lower than min_gas)
+        """
+        return fn.build_transaction({
+            'from': self.address,
+            'nonce': nonce,
+            'gas': self.estimate_gas(fn, min_gas=min_gas) if gas is None else gas,
+            'gasPrice': gas_price(self.chain) if gas_price_wei is None else gas_price_wei,
+            'chainId': get_chain_id(self.chain) if chain_id is None else chain_id,
+            'value': 0,
+        })
+
+    def sign(self, tx):
+        """
+        Raw signed transaction bytes
+        """
+        signed = self.account.sign_transaction(tx)
+        return getattr(signed, 'raw_transaction', None) or getattr(signed, 'rawTransaction')
+
+    def send(self, fn, nonce, gas=None, min_gas=0):
+        """
+        Builds, signs and sends the contract call fn; returns the tx hash
+        """
+        return self.w3.eth.send_raw_transaction(self.sign(self.build(fn, nonce, gas, min_gas=min_gas)))
+
+
+def get_tx_builder(chain, account):
+    """
+    Process-wide TxBuilder of account on chain
+    """
+    key = (canonical_chain(chain), account.address)
+    with _lock:
+        builder = _builders.get(key)
+        if builder is None:
+            builder = _builders[key] = TxBuilder(chain, account)
+    return builder
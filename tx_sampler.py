@@ -0,0 +1,155 @@
+"""
+Random access to the lines ("transactions") of large text files
+
+The first time a file is opened a line-offset index is built and saved
+next to it as <filename>.idx. Later opens memory-map the index (and the
+file itself), so sampling never reads the whole file into memory.
+"""
+import mmap
+import os
+import random
+import struct
+from array import array
+
+INDEX_MAGIC = b'LIDX'
+INDEX_VERSION = 1
+# magic, version, size of the indexed file, its mtime (ns), number of lines
+INDEX_HEADER = struct.Struct('<4sIQQQ')
+# Offsets are buffered and written to the index this many at a time
+OFFSET_BATCH = 1 << 16
+
+
+def index_path(filename):
+    return f"{filename}.idx"
+
+
+def build_index(filename, index_file=None):
+    """
+    Scans filename once and writes the index: the header followed by
+    count + 1 little-endian uint64 offsets, where line i spans
+    offsets[i] .. offsets[i+1]. The index is written to a temporary file
+    and renamed into place, so a crash never leaves a truncated index
+    """
+    index_file = index_file or index_path(filename)
+    st = os.stat(filename)
+    tmp = f"{index_file}.tmp{os.getpid()}"
+    count = 0
+    with open(filename, 'rb') as src, open(tmp, 'wb') as out:
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, 0, 0))
+        offsets = array('Q', [0])
+        if st.st_size:
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = 0
+                while pos < st.st_size:
+                    nl = data.find(b'\n', pos)
+                    pos = st.st_size if nl < 0 else nl + 1
+                    offsets.append(pos)
+                    count += 1
+                    if len(offsets) >= OFFSET_BATCH:
+                        offsets.tofile(out)
+                        offsets = array('Q')
+        offsets.tofile(out)
+        out.seek(0)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, st.st_size, st.st_mtime_ns, count))
+    os.replace(tmp, index_file)
+    return index_file
+
+
+class TransactionSampler:
+    """
+    Memory-mapped view of the lines of a text file.
+
+    sampler = TransactionSampler("bitcoin_text.txt")
+    sampler.sample(10)              # 10 lines drawn uniformly from the whole file
+    for txs in sampler.templates(10):
+        ...                         # endless stream of 10-line block templates
+    """
+
+    def __init__(self, filename, index_file=None):
+        self.filename = filename
+        self.index_file = index_file or index_path(filename)
+        self._data = None
+        self._index = None
+        self._open()
+
+    def _index_is_current(self):
+        try:
+            with open(self.index_file, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+        except OSError:
+            return False
+        if len(header) != INDEX_HEADER.size:
+            return False
+        magic, version, size, mtime_ns, _ = INDEX_HEADER.unpack(header)
+        st = os.stat(self.filename)
+        return (magic, version, size, mtime_ns) == (INDEX_MAGIC, INDEX_VERSION, st.st_size, st.st_mtime_ns)
+
+    def _open(self):
+        if not self._index_is_current():
+            build_index(self.filename, self.index_file)
+
+        with open(self.index_file, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, size, _, self.count = INDEX_HEADER.unpack_from(self._index)
+        self._offsets = memoryview(self._index)[INDEX_HEADER.size:].cast('Q')
+
+        if size:
+            with open(self.filename, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b''
+
+    def close(self):
+        self._offsets.release()
+        self._index.close()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def line(self, i):
+        """
+        Returns line i with surrounding whitespace (and the newline) stripped
+        """
+        if not 0 <= i < self.count:
+            raise IndexError(f"line {i} out of range for {self.filename} ({self.count} lines)")
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode('utf-8').strip()
+
+    def sample(self, quantity, rng=random):
+        """
+        Returns quantity lines drawn uniformly (with replacement) from the whole file
+        """
+        if self.count == 0:
+            raise ValueError(f"{self.filename} has no lines to sample")
+        return [self.line(rng.randrange(self.count)) for _ in range(quantity)]
+
+    def templates(self, quantity, rng=random):
+        """
+        Endless iterator of block templates, each a list of quantity sampled lines
+        """
+        while True:
+            yield self.sample(quantity, rng)
+
+
+_samplers = {}
+
+
+def get_sampler(filename):
+    """
+    Returns a TransactionSampler for filename, shared within the process
+    (it is reopened if the file has changed since)
+    """
+    key = os.path.abspath(filename)
+    sampler = _samplers.get(key)
+    if sampler is None or not sampler._index_is_current():
+        if sampler is not None:
+            sampler.close()
+        sampler = _samplers[key] = TransactionSampler(filename)
+    return sampler